@@ -0,0 +1,135 @@
+from decimal import Decimal, InvalidOperation
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError, TypeError):
+        return Decimal('0.00')
+
+
+def split_order_lines(apps, schema_editor):
+    # every old Order row was one cart line with string amounts, it becomes an
+    # order header with a single OrderItem
+    Order = apps.get_model('accounts', 'Order')
+    OrderItem = apps.get_model('accounts', 'OrderItem')
+    Product = apps.get_model('core', 'Product')
+
+    products = {}
+    for pk, name in Product.objects.values_list('pk', 'name').order_by('-pk'):
+        products.setdefault(name, pk)
+
+    items = []
+    orders = list(Order.objects.all())
+    for order in orders:
+        price = to_decimal(order.price)
+        total = to_decimal(order.total)
+        order.amount = total
+        items.append(OrderItem(
+            order_id=order.pk,
+            product_id=products.get(order.product),
+            name=order.product,
+            price=price,
+            quantity=order.quantity,
+            total=total,
+        ))
+    Order.objects.bulk_update(orders, ['amount'], batch_size=500)
+    OrderItem.objects.bulk_create(items, batch_size=500)
+
+
+def join_order_lines(apps, schema_editor):
+    Order = apps.get_model('accounts', 'Order')
+    orders = list(Order.objects.prefetch_related('items'))
+    for order in orders:
+        item = next(iter(order.items.all()), None)
+        order.total = str(order.amount)
+        if item is not None:
+            order.product = item.name
+            order.price = str(item.price)
+            order.quantity = item.quantity
+        else:
+            order.product, order.price, order.quantity = '', '0', 0
+    Order.objects.bulk_update(orders, ['total', 'product', 'price', 'quantity'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_order'),
+        ('core', '0013_product_rating_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('quantity', models.PositiveSmallIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='accounts.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.product')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(split_order_lines, join_order_lines),
+        # defaults only so the old per-line columns can be re-added when migrating backwards
+        migrations.AlterField(
+            model_name='order',
+            name='product',
+            field=models.CharField(default='', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='price',
+            field=models.CharField(default='0', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='quantity',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total',
+            field=models.CharField(default='0', max_length=200),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='image',
+            field=models.ImageField(default='', upload_to='order_image'),
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='image',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='price',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='product',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='quantity',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='total',
+        ),
+        migrations.RenameField(
+            model_name='order',
+            old_name='amount',
+            new_name='total',
+        ),
+    ]
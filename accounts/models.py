@@ -15,13 +15,25 @@ class Profile(models.Model):
 
 
 class Order(models.Model):
-    product=models.CharField(max_length=200)
     user=models.ForeignKey(CustomUserModel, on_delete=models.CASCADE)
     phone=models.CharField(max_length=200)
     address=models.CharField(max_length=200)
-    price=models.CharField(max_length=200)
-    quantity=models.PositiveSmallIntegerField()
-    total=models.CharField(max_length=200)
+    total=models.DecimalField(max_digits=12, decimal_places=2, default=0)
     is_pay=models.BooleanField(default=False)
-    image=models.ImageField(upload_to="order_image")
-    order_date=models.DateTimeField(auto_now=True)
\ No newline at end of file
+    order_date=models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Order #{self.id} ({self.user_id})"
+
+
+class OrderItem(models.Model):
+    order=models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
+    # product can be removed from the catalog later, name keeps the line readable
+    product=models.ForeignKey('core.Product', on_delete=models.SET_NULL, null=True, blank=True)
+    name=models.CharField(max_length=200)
+    price=models.DecimalField(max_digits=8, decimal_places=2)
+    quantity=models.PositiveSmallIntegerField()
+    total=models.DecimalField(max_digits=12, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.name} x {self.quantity}"
@@ -1,3 +1,94 @@
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+
+from core import product_cache
+from core.models import Product
+from core.perf import BudgetTestMixin, QueryPlanTestMixin
+from core.tests import seed_catalog
+from payments.models import Transaction
+from .models import Order, OrderItem
+
+
+class ViewQueryBudgetTests(BudgetTestMixin, QueryPlanTestMixin, TestCase):
+    """Every accounts page stays within its QUERY_BUDGETS entry (accounts/urls.py), off indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.products, cls.posts = seed_catalog()
+        cls.user = cls.users[0]
+        for n in range(8):
+            order = Order.objects.create(user=cls.user, phone='9800000000', address='Kathmandu', is_pay=n % 2 == 0)
+            items = [
+                OrderItem(order=order, product=product, name=product.name, price=product.price,
+                          quantity=2, total=product.price * 2)
+                for product in cls.products[n:n + 4]
+            ]
+            OrderItem.objects.bulk_create(items)
+            order.total = sum(item.total for item in items)
+            order.save()
+            if order.is_pay:
+                Transaction.objects.create(order=order, user=cls.user.username, transaction_id=f'T{n}',
+                                           total=str(order.total))
+        cls.order = order
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        self.client.force_login(self.user)
+
+    def test_register(self):
+        self.assertWithinBudget(self.client.get(reverse('register')))
+
+    def test_log_in(self):
+        self.assertWithinBudget(self.client.get(reverse('log_in')))
+
+    def test_log_out(self):
+        self.login()
+        self.assertWithinBudget(self.client.get(reverse('log_out')))
+
+    def test_profile_dashboard(self):
+        self.login()
+        self.assertWithinBudget(self.client.get(reverse('profile_dashboard')))
+
+    def test_profile(self):
+        self.login()
+        self.assertWithinBudget(self.client.get(reverse('profile')))
+
+    def test_my_order(self):
+        self.login()
+        self.assertWithinBudget(self.client.get(reverse('my_order')))
+
+    def test_my_order_query_plan(self):
+        self.login()
+        self.assertNoFullScans(self.client.get(reverse('my_order')))
+        # newest first per user comes straight off the user FK index, it ends in the rowid
+        self.assertUsesIndex(Order.objects.filter(user=self.user).order_by('-id'), 'accounts_order_user_id')
+
+    def test_checkout(self):
+        self.login()
+        session = self.client.session
+        session['cart'] = {str(product.id): 1 for product in self.products[:8]}
+        session.save()
+        response = self.client.post(reverse('my_order'), {'phone': '9800000000', 'address': 'Kathmandu'})
+        self.assertEqual(self.user.order_set.count(), 9)
+        self.assertWithinBudget(response)
+
+    def test_checkout_charges_current_prices(self):
+        self.login()
+        product = self.products[0]
+        product_cache.get_many([product.id])
+        # bulk edits send no signals, the cached product keeps the old price
+        Product.objects.filter(pk=product.pk).update(price=Decimal('1.50'))
+        session = self.client.session
+        session['cart'] = {str(product.id): 2}
+        session.save()
+        self.client.post(reverse('my_order'), {'phone': '9800000000', 'address': 'Kathmandu'})
+        self.assertEqual(self.user.order_set.latest('id').total, Decimal('3.00'))
 
-# Create your tests here.
+    def test_cancel_order(self):
+        self.login()
+        self.assertWithinBudget(self.client.get(reverse('cancel_order', args=[self.order.id])))
@@ -9,4 +9,16 @@ urlpatterns=[
   path("profile/",profile,name='profile'),
   path("my_order/",my_order,name='my_order'),
   path('cancel-order/<int:order_id>/', cancel_order, name='cancel_order'),
-]
\ No newline at end of file
+]
+
+
+# most SQL queries a request may run, enforced by accounts/tests.py (see core/perf.py)
+QUERY_BUDGETS = {
+  'register': 1,
+  'log_in': {'GET': 1, 'POST': 8},
+  'log_out': 5,
+  'profile_dashboard': 3,
+  'profile': 7,
+  'my_order': {'GET': 6, 'POST': 12},
+  'cancel_order': 7,
+}
@@ -7,7 +7,9 @@ from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django.contrib.auth import authenticate,login,logout
 from django.contrib.auth.decorators import login_required
-from accounts.models import Order
+from django.db import transaction
+from accounts.models import Order, OrderItem
+from core.shopping_cart import SessionCart
 
 from .models import Profile
 from .forms import ProfileForm
@@ -81,10 +83,9 @@ def log_in(request):
 
         if user is not None:
             login(request,user)
-            if remember_me:
-                request.session.set_expiry(150000)
-            else:
-                request.session.set_expiry(0)
+            expiry=150000 if remember_me else 0
+            if request.session.get('_session_expiry')!=expiry:
+                request.session.set_expiry(expiry)
 
             next=request.POST.get('next','')
             return redirect(next if next else'index')
@@ -127,29 +128,38 @@ def profile(request):
 
     return render(request, 'profile/profile.html',context)
 
+@login_required(login_url="log_in")
 def my_order(request):
     if request.method == 'POST':
         phone=request.POST['phone']
         address=request.POST['address']
-        cart=request.session.get('cart')
-        print(cart)
-        # {'5': {'userid': 4, 'product_id': 5, 'name': 'Fan', 'quantity': 3, 
-        #        'price': '11400.00', 'image': '/media/images/android-chrome-192x192.png'}, 
-        #        '1': {'userid': 4, 'product_id': 1, 'name': 'Miraj tamang', 'quantity': 1, 
-        #              'price': '6000.00', 'image': '/media/images/shoes.jpeg'}} 
-        for i in cart:
-            product=cart[i]['name']
-            quantity=cart[i]['quantity']
-            price=cart[i]['price']
-            total=float(price) * quantity
-            image=cart[i]['image'] 
-            order=Order(product=product,quantity=quantity,price=price,image=image,total=total,phone=phone,address=address,user=request.user)
-            order.save()
-        request.session['cart']={}
+        cart=SessionCart(request)
+        if not cart.cart:
+            messages.error(request, 'Your cart is empty.')
+            return redirect('cart_detail')
+
+        # prices come from the catalog table, not from the session or the product cache, all in one query
+        items=[OrderItem(product=line['product'], name=line['product'].name, price=line['product'].price,
+                         quantity=line['quantity'], total=line['total'])
+               for line in cart.lines(fresh=True)]
+
+        if not items:
+            messages.error(request, 'The products in your cart are no longer available.')
+            cart.clear()
+            return redirect('cart_detail')
+
+        with transaction.atomic():
+            order=Order.objects.create(user=request.user, phone=phone, address=address,
+                                       total=sum(item.total for item in items))
+            for item in items:
+                item.order=order
+            OrderItem.objects.bulk_create(items)
+
+        cart.clear()
         return redirect('my_order')
          
          
-    myorder=Order.objects.filter(user=request.user)
+    myorder=Order.objects.filter(user=request.user).prefetch_related('items__product', 'transaction_set').order_by('-id')
     context = {
         'myorder' : myorder
     }
@@ -20,11 +20,11 @@ class ProductAdminImage(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'price', 'mark_price', 'discount_percent', 'category', 'subcategory']
+    list_display = ['id', 'name', 'price', 'mark_price', 'discount_percent', 'category', 'subcategory', 'review_count']
     list_filter = ['category', 'subcategory', 'created_date']
     search_fields = ['name', 'desc']
     inlines = [ProductAdminImage]
-    readonly_fields = ['price', 'created_date']
+    readonly_fields = ['price', 'created_date', 'review_count', 'rating_sum']
     
     # Organize fields nicely
     fieldsets = (
@@ -40,7 +40,7 @@ class ProductAdmin(admin.ModelAdmin):
             'description': '"desc" for product cards, "description" for detail page'
         }),
         ('Metadata', {
-            'fields': ('created_date',),
+            'fields': ('created_date', 'review_count', 'rating_sum'),
             'classes': ('collapse',)
         })
     )
@@ -0,0 +1,16 @@
+from django.contrib.sessions.backends import cached_db
+
+from .sessions import SkipUnchangedSaveMixin
+
+
+'''
+Session store (SESSION_ENGINE = 'core.cached_sessions')
+
+cached_db with the unchanged-save skip of core/sessions.py: reads come from
+the cache and only fall through to the django_session table on a miss.
+Only correct with a cache shared by every worker process (see CACHES).
+'''
+
+
+class SessionStore(SkipUnchangedSaveMixin, cached_db.SessionStore):
+    pass
@@ -0,0 +1,115 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Category, SubCategory, BlogPost, BlogCategory, BlogComment, Tag
+
+
+'''
+Versioned catalog caches
+
+Cached data is stored under "<name>:<version>". Instead of hunting down every
+key on a change we just bump the version (core/signals.py) and old entries
+expire on their own. Point CACHES at redis/memcached in production so every
+worker process shares the same entries.
+'''
+
+CATEGORY_TREE = 'category_tree'
+BLOG_SIDEBAR = 'blog_sidebar'
+
+# entries are invalidated by version bumps, the timeout only reclaims memory
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_version(name):
+    key = f'{name}:version'
+    version = cache.get(key)
+    if version is None:
+        # start from the clock so a lost version key never reuses an old number
+        cache.add(key, int(time.time()), None)
+        version = cache.get(key, int(time.time()))
+    return version
+
+
+def bump_version(name):
+    key = f'{name}:version'
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time()), None)
+        return cache.get(key)
+
+
+def category_tree_version():
+    return get_version(CATEGORY_TREE)
+
+
+def get_category_tree():
+    """
+    Sidebar categories with their subcategories and product counts as plain dicts.
+    The GROUP BY over products runs once per version, not once per request.
+    """
+    key = f'{CATEGORY_TREE}:{category_tree_version()}'
+    tree = cache.get(key)
+    if tree is None:
+        categories = Category.objects.annotate(
+            subcategory_count=Count('subcategory')
+        ).prefetch_related(
+            Prefetch(
+                'subcategory_set',
+                queryset=SubCategory.objects.annotate(product_count=Count('product'))
+            )
+        )
+        tree = [
+            {
+                'id': cat.id,
+                'title': cat.title,
+                'subcategory_count': cat.subcategory_count,
+                'subcategories': [
+                    {'id': sub.id, 'title': sub.title, 'product_count': sub.product_count}
+                    for sub in cat.subcategory_set.all()
+                ],
+            }
+            for cat in categories
+        ]
+        cache.set(key, tree, CATALOG_CACHE_TIMEOUT)
+    return tree
+
+
+def blog_posts():
+    """
+    Published posts with everything the blog templates touch:
+    author and category joined, tags prefetched, comments counted (post.comment_count).
+    """
+    # counted per row in a subquery rather than JOIN + GROUP BY, so a page
+    # of posts is read in created_at order off blogpost_published_idx and stops at the LIMIT
+    comments = BlogComment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(
+        total=Count('pk')
+    ).values('total')
+    return BlogPost.objects.filter(is_published=True).select_related(
+        'author', 'category'
+    ).prefetch_related('tags').annotate(
+        num_comments=Coalesce(Subquery(comments, output_field=IntegerField()), 0)
+    )
+
+
+def get_blog_sidebar():
+    """Categories with counts, popular tags, recent and featured posts, cached per version"""
+    key = f'{BLOG_SIDEBAR}:{get_version(BLOG_SIDEBAR)}'
+    sidebar = cache.get(key)
+    if sidebar is None:
+        published = BlogPost.objects.filter(is_published=True).order_by('-created_at')
+        sidebar = {
+            'blog_categories': list(BlogCategory.objects.annotate(post_count=Count('blogpost'))),
+            'recent_posts': list(published.only('title', 'slug', 'created_at')[:5]),
+            'featured_posts': list(
+                published.filter(is_featured=True).only(
+                    'title', 'slug', 'excerpt', 'featured_image', 'created_at'
+                )[:3]
+            ),
+            'popular_tags': list(Tag.objects.annotate(post_count=Count('blogpost')).order_by('-post_count')[:10]),
+        }
+        cache.set(key, sidebar, CATALOG_CACHE_TIMEOUT)
+    return sidebar
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+'''
+System checks for settings the performance code relies on
+'''
+
+
+@register(Tags.caches, deploy=True)
+def check_page_cache(app_configs, **kwargs):
+    """The page cache's lock and version need one cache for all workers"""
+    if settings.PAGE_CACHE_TIMEOUT and not settings.CACHE_IS_SHARED:
+        return [Warning(
+            "The page cache is on but CACHES['default'] is private to each process.",
+            hint="Point CACHE_BACKEND at redis or memcached, or set PAGE_CACHE_TIMEOUT=0. Otherwise "
+                 "every worker renders its own copy of a page and content changes only invalidate "
+                 "the pages of the worker that made them.",
+            id='core.W001',
+        )]
+    return []
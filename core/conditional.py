@@ -0,0 +1,116 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .catalog_cache import category_tree_version
+from .shopping_cart import get_summary
+
+
+'''
+Conditional GET for the product and blog pages
+
+A page's content stamp is its row's auto_now timestamp, or later if something
+else on the page changed since (a review, a comment, a gallery image), which
+core/signals.py records with touch(). The ETag adds who is looking: the user,
+their cart summary, their wishlist heart and their CSRF cookie, plus the
+category tree version for the catalog navigation, so a 304 is never sent for a
+page that would render differently. Both are worked out from cached values
+before the view runs its queries or template. A page with flash messages to
+show is rendered without validators, it never matches a later request.
+Anonymous pages get Last-Modified and may be stored by shared caches, pages of
+logged-in users are private. Every browser revalidates on each visit (no-cache),
+which costs a 304 instead of a full render.
+'''
+
+STAMP_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _stamp_key(name, pk):
+    return f'stamp:{name}:{pk}'
+
+
+def touch(name, pk):
+    """Something shown on page `name`/`pk` changed just now"""
+    cache.set(_stamp_key(name, pk), time.time(), STAMP_TIMEOUT)
+
+
+def stamp(name, pk):
+    """When page `name`/`pk` last changed besides its own row, as a unix time"""
+    key = _stamp_key(name, pk)
+    value = cache.get(key)
+    if value is None:
+        # unknown after an eviction, so assume it just changed, costing one full render per client
+        cache.add(key, time.time(), STAMP_TIMEOUT)
+        value = cache.get(key, time.time())
+    return value
+
+
+def viewer_fingerprint(request):
+    """What the page shows that depends on the visitor rather than the content"""
+    # CsrfViewMiddleware puts the cookie's secret here, or a new one once the page asks for a token
+    csrf = request.META.get('CSRF_COOKIE', '')
+    user = request.user
+    if not user.is_authenticated:
+        return ['anon', csrf]
+    summary = get_summary(request)
+    return [user.pk, summary['lines'], summary['quantity'], summary['subtotal'], csrf]
+
+
+def has_messages(request):
+    """Flash messages are waiting to be shown, len() reads them without marking them used"""
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def _etag(changed, parts, request):
+    raw = ':'.join(map(str, [changed, category_tree_version(), *parts, *viewer_fingerprint(request)]))
+    # weak: the body differs in its masked CSRF tokens but means the same
+    return 'W/"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def conditional_page(validators):
+    """
+    View decorator. validators(request, *args, **kwargs) returns (last change as
+    a unix time, [page specific visitor state]) or None to just run the view
+    (eg. to let it 404).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or has_messages(request):
+                return view(request, *args, **kwargs)
+            found = validators(request, *args, **kwargs)
+            if found is None:
+                return view(request, *args, **kwargs)
+
+            changed, parts = found
+            # HTTP dates only have whole seconds, the ETag keeps sub-second changes apart
+            last_modified = int(changed)
+            personal = request.user.is_authenticated
+            # Last-Modified knows nothing about the visitor, so it is only offered when there is none
+            etag = _etag(changed, parts, request)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=None if personal else last_modified,
+            )
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                # rendering may have issued a CSRF cookie, the next request will send it
+                etag = _etag(changed, parts, request)
+            response.headers['ETag'] = etag
+            if not personal:
+                response.headers['Last-Modified'] = http_date(last_modified)
+
+            if personal or request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .shopping_cart import get_summary
+
+
+def cart_summary(request):
+    """
+    cart_summary.lines / .quantity / .subtotal, lazy so a page that never
+    shows the cart does not even load the session.
+    """
+    return {'cart_summary': SimpleLazyObject(lambda: get_summary(request))}
@@ -0,0 +1,194 @@
+import posixpath
+import re
+
+from django.conf import settings
+
+
+'''
+Site CSS bundle and critical CSS
+
+base.html used to link every site stylesheet on its own, each one blocking
+the first paint. collectstatic (CompressedManifestStaticFilesStorage in
+core/staticfiles.py) now concatenates SOURCES in their cascade order into one
+minified css/site.css, which is hashed and precompressed like any other file,
+and pulls out css/site.critical.css: the rules for what is above the fold on
+every page (the navbar, the hero slider, the product grid) plus bare element
+rules. {% site_stylesheets %} (core/templatetags/css_tags.py) inlines the
+critical rules and loads the bundle without blocking rendering, or links
+SOURCES one by one when there is no collected bundle (DEBUG, no collectstatic).
+'''
+
+# the order base.html linked them in, later rules win
+SOURCES = [
+    'css/prettyPhoto.css',
+    'css/animate.css',
+    'css/main.css',
+    'css/product.css',
+    'css/responsive.css',
+    'css/base.css',
+]
+# next to the sources, so their relative url()s stay valid
+BUNDLE = 'css/site.css'
+CRITICAL = 'css/site.critical.css'
+
+# classes and ids of the navbar, the hero slider and the product grid
+CRITICAL_NAMES = re.compile(
+    r'[.#](navbar|nav-|dropdown|custom-navbar|cart-|sticky-top|badge|'
+    r'slider|carousel|btn-slider|text-ownies|'
+    r'product-card|card|hp\b|padding-right|features_items|btn-gradient|hover-heart|aff-link|left-sidebar|'
+    r'container|row\b|col\b|col-)'
+)
+# selectors made only of element names (html, body, a, h1 ul li, ...)
+ELEMENTS_ONLY = re.compile(r'^[\w\s,>+~*:-]+$')
+# commas of a selector list, not those inside :not(...) and the like
+SELECTORS = re.compile(r',(?![^(]*\))')
+# pseudo classes and elements that never matter before the first interaction
+INTERACTIVE = re.compile(r':(hover|focus|active|visited|focus-within|focus-visible)|::?(after|before)')
+
+# strings and url(...) are copied verbatim, comments dropped, anything else tokenized
+TOKENS = re.compile(r'''
+    (?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+  | (?P<url>url\(\s*[^)"'\s]*\s*\))
+  | (?P<comment>/\*.*?\*/)
+  | (?P<space>\s+)
+  | (?P<other>[^"'/\s]+?(?=url\(|["'/\s]|$)|/)
+''', re.VERBOSE | re.DOTALL | re.IGNORECASE)
+# at-rules whose blocks hold more rules
+GROUPING = ('@media', '@supports')
+# no whitespace is needed next to these
+TIGHT = set('{};,>')
+URL = re.compile(r'url\(\s*(["\']?)([^)"\']*)\1\s*\)', re.IGNORECASE)
+
+
+def minify(css):
+    out = []
+    pending_space = False
+    for match in TOKENS.finditer(css):
+        kind, text = match.lastgroup, match.group()
+        if kind in ('comment', 'space'):
+            pending_space = True
+            continue
+        if kind == 'other':
+            # the last declaration of a block needs no semicolon
+            text = text.replace(';}', '}')
+            if text[0] == '}' and out and out[-1] == ';':
+                out.pop()
+            elif text[0] == '}' and out and out[-1].endswith(';'):
+                out[-1] = out[-1][:-1]
+        if pending_space and out and out[-1][-1] not in TIGHT and out[-1][-1] != ':' and text[0] not in TIGHT:
+            out.append(' ')
+        pending_space = False
+        out.append(text)
+    return ''.join(out).strip()
+
+
+def _skip_string(css, i):
+    quote = css[i]
+    i += 1
+    while css[i] != quote:
+        i += 2 if css[i] == '\\' else 1
+    return i + 1
+
+
+def _matching_brace(css, i):
+    depth = 0
+    while True:
+        char = css[i]
+        if char in '"\'':
+            i = _skip_string(css, i)
+            continue
+        depth += {'{': 1, '}': -1}.get(char, 0)
+        if not depth:
+            return i
+        i += 1
+
+
+def parse(css):
+    """
+    Minified css as a list of (prelude, body): body is None for statements
+    (@import, @charset), a list of rules for @media/@supports, otherwise the
+    text between the braces (declarations, or the frames of a @keyframes).
+    """
+    rules, start, i = [], 0, 0
+    while i < len(css):
+        char = css[i]
+        if char in '"\'':
+            i = _skip_string(css, i)
+        elif char == ';':
+            rules.append((css[start:i].strip(), None))
+            start = i = i + 1
+        elif char == '{':
+            prelude, end = css[start:i].strip(), _matching_brace(css, i)
+            body = css[i + 1:end]
+            rules.append((prelude, parse(body) if prelude.startswith(GROUPING) else body))
+            start = i = end + 1
+        else:
+            i += 1
+    return rules
+
+
+def serialize(rules):
+    out = []
+    for prelude, body in rules:
+        if body is None:
+            out.append(f'{prelude};')
+        elif isinstance(body, list):
+            if body:
+                out.append(f'{prelude}{{{serialize(body)}}}')
+        else:
+            out.append(f'{prelude}{{{body}}}')
+    return ''.join(out)
+
+
+def is_critical(selector):
+    selector = selector.strip()
+    if INTERACTIVE.search(selector):
+        return False
+    return bool(CRITICAL_NAMES.search(selector) or ELEMENTS_ONLY.match(selector))
+
+
+def critical(rules):
+    """The rules of `rules` that style above-the-fold markup, keeping their @media blocks"""
+    kept = []
+    for prelude, body in rules:
+        if isinstance(body, list):
+            if prelude.startswith(GROUPING):
+                inner = critical(body)
+                if inner:
+                    kept.append((prelude, inner))
+        elif body is not None and not prelude.startswith('@'):
+            selectors = [selector for selector in SELECTORS.split(prelude) if is_critical(selector)]
+            if selectors:
+                kept.append((','.join(selectors), body))
+    return kept
+
+
+def absolute_urls(css, name):
+    """Make relative url()s in `css` from static file `name` absolute, for inlining into a page"""
+    base = posixpath.dirname(name)
+
+    def replace(match):
+        url = match.group(2).strip()
+        if re.match(r'^([a-z]+:|/|#|%)', url, re.IGNORECASE):
+            return match.group()
+        return f'url({settings.STATIC_URL}{posixpath.normpath(posixpath.join(base, url))})'
+    return URL.sub(replace, css)
+
+
+def build(read):
+    """
+    Returns the (bundle, critical) css for SOURCES, read(name) gives a source's
+    text or None when it is missing.
+    """
+    imports, rules = [], []
+    for name in SOURCES:
+        css = read(name)
+        if css is None:
+            continue
+        for prelude, body in parse(minify(css.lstrip('\ufeff'))):
+            if prelude.startswith('@charset'):
+                continue
+            # @import only works at the top of a stylesheet
+            (imports if body is None and prelude.startswith('@import') else rules).append((prelude, body))
+    bundle = serialize([*imports, *rules])
+    return bundle, absolute_urls(serialize(critical(rules)), BUNDLE)
@@ -0,0 +1,297 @@
+import html
+import random
+import re
+import subprocess
+import threading
+import time
+from array import array
+
+import django
+import requests
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.urls import reverse
+
+from accounts.models import CustomUserModel
+from .models import SubCategory, Product, BlogPost
+from .synthetic import ADJECTIVES, NOUNS
+
+
+'''
+Load test harness (`python manage.py loadtest`)
+
+Concurrent virtual users drive the real URL map over HTTP: browsing (index
+with filters and keyset pages, search, product pages, blog), the cart and
+wishlist flows, and checkout through my_order and Khalti, which points at
+KhaltiStubServer (payments/khalti_stub.py). Data comes from `generate_data`;
+every virtual user follows its own Random(f"{seed}:{n}"), so two runs with the
+same seed, data and options send the same requests and their reports can be
+compared across commits. Queries per request are read from the Server-Timing header that
+PerfBudgetMiddleware adds (core/perf.py).
+By default the site runs in-process on a threaded WSGI server, which shares
+the GIL with the virtual users; for absolute numbers run it under a real
+server with KHALTI_BASE_URL at the stub (run_khalti_stub) and PERF_SERVER_TIMING on, and pass --url.
+'''
+
+SERVER_TIMING_QUERIES = re.compile(r'sql;[^,]*desc="(\d+) queries"')
+PAY_LINK = re.compile(r'href="([^"]*/initkhalti/\d+)"')
+NEXT_PAGE = re.compile(r'href="(\?[^"#]*after=[^"#]*)')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServer:
+    """The project's WSGI application on a free local port, in a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadedWSGIServer((host, port), QuietRequestHandler, allow_reuse_address=False)
+        self.server.set_app(get_internal_wsgi_application())
+        self.url = f'http://{host}:{self.server.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class EndpointStats:
+
+    def __init__(self):
+        self.latencies = array('d')  # seconds
+        self.queries = array('l')
+        self.errors = 0
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class Catalog:
+    """What the virtual users pick from, loaded once before the run"""
+
+    def __init__(self, user_prefix):
+        self.products = array('q', Product.objects.order_by('pk').values_list('pk', flat=True).iterator())
+        self.subcategories = list(SubCategory.objects.order_by('pk').values_list('pk', flat=True))
+        self.posts = list(BlogPost.objects.filter(is_published=True).order_by('pk').values_list('slug', flat=True))
+        self.usernames = list(CustomUserModel.objects.filter(username__startswith=user_prefix)
+                              .order_by('pk').values_list('username', flat=True))
+
+
+class VirtualUser:
+
+    def __init__(self, harness, number):
+        self.harness = harness
+        self.catalog = harness.catalog
+        self.rng = random.Random(f'{harness.seed}:{number}')
+        self.session = requests.Session()
+        self.username = None
+        if number % 2 == 0 and self.catalog.usernames:
+            # even users log in, odd users browse and shop anonymously
+            self.username = self.catalog.usernames[(number // 2) % len(self.catalog.usernames)]
+        self.record = False
+
+    def url(self, name, *args):
+        return self.harness.base_url + reverse(name, args=args)
+
+    def request(self, label, method, url, **kwargs):
+        if method != 'GET':
+            kwargs.setdefault('headers', {})['X-CSRFToken'] = self.session.cookies.get('csrftoken', '')
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, allow_redirects=False, timeout=60, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        elapsed = time.perf_counter() - start
+        if self.record:
+            self.harness.add(label, elapsed, response, ok)
+        return response
+
+    def get(self, label, url, **params):
+        return self.request(label, 'GET', url, params=params or None)
+
+    def post(self, label, url, **kwargs):
+        return self.request(label, 'POST', url, **kwargs)
+
+    def product(self):
+        return self.rng.choice(self.catalog.products)
+
+    '''  Scenarios  '''
+    def log_in(self):
+        self.get('log_in', self.url('log_in'))
+        if self.username:
+            self.post('log_in', self.url('log_in'),
+                      data={'username': self.username, 'password': self.harness.password})
+
+    def browse(self):
+        self.get('index', self.url('index'))
+        if self.catalog.subcategories:
+            self.get('index[filtered]', self.url('index'), subcategory=self.rng.choice(self.catalog.subcategories),
+                     min=self.rng.randrange(0, 5000), max=self.rng.randrange(5000, 50000))
+        first = self.get('index[sort=price]', self.url('index'), sort='price')
+        next_page = NEXT_PAGE.search(first.text) if first is not None else None
+        if next_page:
+            self.get('index[sort=price,next]', self.url('index') + html.unescape(next_page.group(1)))
+        self.get('search', self.url('search'), q=self.rng.choice(ADJECTIVES + NOUNS))
+        product = self.product()
+        self.get('product_detail', self.url('product_detail', product))
+        self.get('product_reviews', self.url('product_reviews', product))
+        self.get('blog', self.url('blog'))
+        if self.catalog.posts:
+            self.get('blog_detail', self.url('blog_detail', self.rng.choice(self.catalog.posts)))
+
+    def shop(self):
+        for _ in range(self.rng.randint(1, 3)):
+            self.get('cart_add', self.url('cart_add', self.product()))
+        self.get('cart_detail', self.url('cart_detail'))
+        product = self.product()
+        self.get('cart_add', self.url('cart_add', product))
+        self.get('item_increment', self.url('item_increment', product))
+        self.get('item_decrement', self.url('item_decrement', product))
+        operations = [{'op': 'add', 'product_id': self.product(), 'qty': self.rng.randint(1, 3)} for _ in range(3)]
+        self.post('cart_api', self.url('cart_api'), json={'operations': operations})
+        if self.rng.random() < 0.3:
+            self.get('cart_clear', self.url('cart_clear'))
+
+    def wish(self):
+        for _ in range(2):
+            self.post('toggle_wishlist', self.url('toggle_wishlist', self.product()))
+        self.get('wishlist', self.url('wishlist'))
+
+    def checkout(self):
+        self.get('cart_add', self.url('cart_add', self.product()))
+        self.post('my_order[POST]', self.url('my_order'), data={'phone': '9800000000', 'address': 'Load test street'})
+        page = self.get('my_order', self.url('my_order'))
+        link = PAY_LINK.search(page.text) if page is not None else None
+        if link:
+            # initkhalti redirects to the stub's payment_url, which returns straight to verify
+            response = self.get('initkhalti', self.harness.base_url + link.group(1))
+            if response is not None and response.is_redirect:
+                self.get('verify', response.headers['Location'])
+
+    def iteration(self):
+        scenarios = [self.browse, self.shop] + ([self.wish, self.checkout] if self.username else [])
+        weights = [6, 3] + ([1, 1] if self.username else [])
+        self.rng.choices(scenarios, weights)[0]()
+
+    def run(self):
+        try:
+            self.log_in()
+            for _ in range(self.harness.warmup):
+                self.iteration()
+        finally:
+            self.harness.barrier.wait()
+        self.record = True
+        for _ in range(self.harness.iterations):
+            self.iteration()
+
+
+class LoadTest:
+
+    def __init__(self, base_url, users=10, iterations=20, warmup=2, seed=0, user_prefix='loaduser',
+                 password='loadtest'):
+        self.base_url = base_url.rstrip('/')
+        self.users = users
+        self.iterations = iterations
+        self.warmup = warmup
+        self.seed = seed
+        self.user_prefix = user_prefix
+        self.password = password
+        self.catalog = Catalog(user_prefix)
+        self.stats = {}
+        self._lock = threading.Lock()
+        self.started = self.finished = None
+        self.barrier = threading.Barrier(users, action=self._start_clock)
+
+    def _start_clock(self):
+        self.started = time.perf_counter()
+
+    def add(self, label, elapsed, response, ok):
+        queries = None
+        if response is not None:
+            match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+            queries = int(match.group(1)) if match else None
+        with self._lock:
+            stats = self.stats.setdefault(label, EndpointStats())
+            stats.latencies.append(elapsed)
+            if queries is not None:
+                stats.queries.append(queries)
+            if not ok:
+                stats.errors += 1
+
+    def run(self):
+        if not self.catalog.products:
+            raise ValueError("No products to test against, run generate_data first")
+        threads = [threading.Thread(target=VirtualUser(self, n).run, name=f'vu{n}') for n in range(self.users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.finished = time.perf_counter()
+        return self.report()
+
+    def report(self):
+        duration = self.finished - self.started
+
+        def summary(latencies, queries, errors):
+            ordered = sorted(latencies)
+            ms = lambda value: None if value is None else round(value * 1000, 2)  # noqa: E731
+            return {
+                'requests': len(ordered),
+                'errors': errors,
+                'throughput_rps': round(len(ordered) / duration, 2) if duration else None,
+                'latency_ms': {
+                    'mean': ms(sum(ordered) / len(ordered)) if ordered else None,
+                    'p50': ms(percentile(ordered, 0.50)),
+                    'p95': ms(percentile(ordered, 0.95)),
+                    'p99': ms(percentile(ordered, 0.99)),
+                    'max': ms(ordered[-1] if ordered else None),
+                },
+                'queries_per_request': {
+                    'mean': round(sum(queries) / len(queries), 2) if queries else None,
+                    'max': max(queries) if queries else None,
+                },
+            }
+
+        endpoints = {label: summary(s.latencies, s.queries, s.errors) for label, s in sorted(self.stats.items())}
+        every = list(self.stats.values())
+        return {
+            'meta': {
+                'commit': git_commit(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'base_url': self.base_url,
+                'users': self.users,
+                'iterations': self.iterations,
+                'warmup': self.warmup,
+                'seed': self.seed,
+                'database': connection.vendor,
+                'products': len(self.catalog.products),
+                'django': django.get_version(),
+                'duration_s': round(duration, 3),
+            },
+            'total': summary(
+                [value for s in every for value in s.latencies],
+                [value for s in every for value in s.queries],
+                sum(s.errors for s in every),
+            ),
+            'endpoints': endpoints,
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from core import thumbnails
+from core.models import Product, ProductImage, OfferProduct
+
+
+class Command(BaseCommand):
+    help = "Generate the responsive WebP/JPEG derivatives for every product, gallery and offer image"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help="Rebuild derivatives that already exist")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Product, ProductImage, OfferProduct):
+            names.update(model.objects.exclude(image='').values_list('image', flat=True).iterator())
+
+        written = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(thumbnails.generate, name, options['force']): name for name in sorted(names)}
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f"{futures[future]}: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} derivatives for {len(names)} images ({failed} failed)"))
@@ -0,0 +1,42 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.synthetic import DEFAULT_SIZES, SCALED, DataGenerator
+
+
+class Command(BaseCommand):
+    help = ("Bulk insert a deterministic synthetic store (users, catalog, reviews, wishlists, blog, orders) "
+            "for load testing, e.g. --scale 100 for about a million products")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help="Same seed and sizes give the same data")
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help=f"Multiplies the row counts of {', '.join(SCALED)}")
+        parser.add_argument('--prefix', default='load',
+                            help="Lowercase letters/digits put in front of usernames and slugs, one per run")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='loadtest', help="Password of every generated user")
+        parser.add_argument('--no-images', action='store_true',
+                            help="Reference the placeholder images without writing them to storage")
+        for name, default in DEFAULT_SIZES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+
+    def handle(self, *args, **options):
+        if not re.fullmatch(r'[a-z0-9]+', options['prefix']):
+            raise CommandError("--prefix may only contain lowercase letters and digits")
+        sizes = {name: options[name] for name in DEFAULT_SIZES}
+        for name in SCALED:
+            sizes[name] = int(sizes[name] * options['scale'])
+
+        generator = DataGenerator(
+            sizes, seed=options['seed'], prefix=options['prefix'], batch_size=options['batch_size'],
+            password=options['password'], write_images=not options['no_images'], log=self.stdout.write,
+        )
+        try:
+            generator.run()
+        except ValueError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            "Done, run build_thumbnails for the image derivatives" if not options['no_images'] else "Done"
+        ))
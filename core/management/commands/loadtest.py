@@ -0,0 +1,65 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from core.loadtest import LocalServer, LoadTest
+from core.perf import PERF_MIDDLEWARE
+from payments.khalti_stub import KhaltiStubServer
+
+
+class Command(BaseCommand):
+    help = ("Drive the site with concurrent virtual users on generate_data data and write "
+            "p50/p95/p99 latency, throughput and queries per request for each endpoint as JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Test a server that is already running (with KHALTI_BASE_URL at "
+                                          "--khalti-port) instead of serving the site in-process")
+        parser.add_argument('--khalti-port', type=int, default=0, help="Port of the Khalti stub, default any free one")
+        parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users")
+        parser.add_argument('--iterations', type=int, default=20, help="Measured scenarios per virtual user")
+        parser.add_argument('--warmup', type=int, default=2, help="Unmeasured scenarios per virtual user first")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='load', help="--prefix the data was generated with")
+        parser.add_argument('--password', default='loadtest')
+        parser.add_argument('--output', default='loadtest.json', help="Where to write the JSON report")
+
+    def handle(self, *args, **options):
+        with KhaltiStubServer(port=options['khalti_port']).start() as khalti:
+            if options['url']:
+                self.stdout.write(f"Khalti stub at {khalti.base_url}")
+                report = self.run(options['url'], options)
+            else:
+                # Server-Timing carries the query counts
+                with override_settings(KHALTI_BASE_URL=khalti.base_url, PERF_SERVER_TIMING=True,
+                                       MIDDLEWARE=self.perf_middleware()), LocalServer() as server:
+                    report = self.run(server.url, options)
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+
+        self.stdout.write(f"{'endpoint':28} {'reqs':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'sql':>6}")
+        for label, stats in [*report['endpoints'].items(), ('total', report['total'])]:
+            latency = stats['latency_ms']
+            queries = stats['queries_per_request']['mean']
+            self.stdout.write(
+                f"{label:28} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps']:>8} "
+                f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {'-' if queries is None else queries:>6}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def perf_middleware(self):
+        # settings.py leaves PerfBudgetMiddleware out unless DEBUG, PERF_BUDGETS or PERF_SERVER_TIMING
+        if PERF_MIDDLEWARE in settings.MIDDLEWARE:
+            return settings.MIDDLEWARE
+        return [settings.MIDDLEWARE[0], PERF_MIDDLEWARE, *settings.MIDDLEWARE[1:]]
+
+    def run(self, url, options):
+        try:
+            return LoadTest(
+                url, users=options['users'], iterations=options['iterations'], warmup=options['warmup'],
+                seed=options['seed'], user_prefix=f"{options['prefix']}user", password=options['password'],
+            ).run()
+        except ValueError as exc:
+            raise CommandError(exc)
@@ -0,0 +1,32 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = ("Delete expired sessions in small batches, so the table is never locked for long "
+            "(clearsessions removes them all in one DELETE)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help="Seconds to sleep between batches to let other writers in")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        total = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            Session.objects.filter(session_key__in=keys).delete()
+            total += len(keys)
+            if options['pause']:
+                time.sleep(options['pause'])
+        # cached copies of these sessions expire from the cache on their own
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} expired sessions"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.ratings import rebuild_rating_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute review_count, rating_sum and the star histogram on every product"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_rating_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating stats for {total} products"))
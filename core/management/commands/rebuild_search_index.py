@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            self.stdout.write(self.style.WARNING("Full-text index needs SQLite FTS5, nothing to rebuild"))
+            return
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} products"))
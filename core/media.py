@@ -0,0 +1,150 @@
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+'''
+Media files (uploads under MEDIA_ROOT)
+
+serve() replaces django.conf.urls.static, which only works with DEBUG on and
+reads every file through Python. Conditional requests (If-None-Match,
+If-Modified-Since) are answered with a 304 before the file is opened.
+With MEDIA_OFFLOAD set the front proxy sends the file itself:
+  'x-accel'    nginx, an `internal` location at MEDIA_ACCEL_PREFIX aliased to MEDIA_ROOT
+  'x-sendfile' apache mod_xsendfile or lighttpd, given the file's absolute path
+Otherwise a FileResponse sends it, honouring a single byte Range (and
+If-Range). The WSGI server's file_wrapper streams it, which gunicorn does with
+sendfile(2), starting at the range offset and stopping after Content-Length.
+'''
+
+OFFLOAD_HEADERS = {'x-accel': 'X-Accel-Redirect', 'x-sendfile': 'X-Sendfile'}
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """`length` bytes of an open file from `start`, keeping fileno() for sendfile"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def byte_range(header, size):
+    """
+    (first, last) byte of a `Range: bytes=` header, None to send the whole file
+    (no header, several ranges or one we can't read). ValueError when it asks
+    for nothing within the file.
+    """
+    match = RANGE.match(header.strip().replace(' ', ''))
+    if not match or match.group() == 'bytes=-':
+        return None
+    first, last = match.groups()
+    if not first:
+        # the last `last` bytes
+        if int(last) == 0:
+            raise ValueError(header)
+        return max(size - int(last), 0), size - 1
+    first, last = int(first), size - 1 if not last else min(int(last), size - 1)
+    if first >= size:
+        raise ValueError(header)
+    if first > last:
+        return None
+    return first, last
+
+
+def _validators(path, st):
+    etag = '"%s"' % hashlib.md5(f'{path}:{st.st_mtime_ns}:{st.st_size}'.encode()).hexdigest()
+    return etag, int(st.st_mtime)
+
+
+def _offload(path, full_path, content_type):
+    offload = settings.MEDIA_OFFLOAD
+    if offload not in OFFLOAD_HEADERS:
+        raise ImproperlyConfigured(f"MEDIA_OFFLOAD must be one of {', '.join(OFFLOAD_HEADERS)} or blank, not {offload!r}")
+    response = HttpResponse(content_type=content_type)
+    if offload == 'x-accel':
+        response[OFFLOAD_HEADERS[offload]] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+    else:
+        response[OFFLOAD_HEADERS[offload]] = full_path
+    return response
+
+
+def _file_response(request, full_path, size, etag, last_modified, content_type):
+    requested = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if requested and if_range and if_range not in (etag, http_date(last_modified)):
+        # the client's partial copy is of an older version, it gets the whole file
+        requested = ''
+    try:
+        span = byte_range(requested, size) if requested else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if span is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        first, last = span
+        response = FileResponse(RangeFile(open(full_path, 'rb'), first, last - first + 1),
+                                content_type=content_type, status=206)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve(request, path):
+    """MEDIA_URL view, see above"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found")
+    try:
+        st = os.stat(full_path)
+    except (OSError, ValueError):
+        raise Http404("Not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404("Not found")
+
+    etag, last_modified = _validators(path, st)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        if settings.MEDIA_OFFLOAD:
+            response = _offload(path, full_path, content_type)
+        else:
+            response = _file_response(request, full_path, st.st_size, etag, last_modified, content_type)
+            if response.status_code == 416:
+                return response
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
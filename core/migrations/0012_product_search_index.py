@@ -0,0 +1,44 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+FTS_TABLE = 'core_product_fts'
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is sqlite only, other databases keep using the icontains fallback in core/search.py
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('core', 'Product')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, body, category, subcategory, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        rows = []
+        for product in Product.objects.select_related('category', 'subcategory').iterator():
+            body = ' '.join(filter(None, [strip_tags(product.desc or ''), strip_tags(product.description or '')]))
+            rows.append((product.pk, product.name, body, product.category.title, product.subcategory.title))
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, body, category, subcategory) VALUES (%s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_wishlist'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:03
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_stats(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    stars = range(1, 6)
+    products = Product.objects.annotate(
+        stat_count=Count('reviews'),
+        stat_sum=Sum('reviews__rating'),
+        **{f'stat_{star}': Count('reviews', filter=Q(reviews__rating=star)) for star in stars}
+    ).filter(stat_count__gt=0)
+    for product in products:
+        product.review_count = product.stat_count
+        product.rating_sum = product.stat_sum or 0
+        for star in stars:
+            setattr(product, f'rating_{star}', getattr(product, f'stat_{star}'))
+    Product.objects.bulk_update(
+        products, ['review_count', 'rating_sum'] + [f'rating_{star}' for star in stars], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_product_rating_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_published', True)), fields=['-created_at'], name='blogpost_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(condition=models.Q(('is_featured', True), ('is_published', True)), fields=['-created_at'], name='blogpost_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['subcategory', 'price', 'id'], name='product_subcat_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wishlist',
+            index=models.Index(fields=['user', '-added_date'], name='wishlist_user_added_idx'),
+        ),
+    ]
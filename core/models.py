@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django_ckeditor_5.fields import CKEditor5Field
 from accounts.models import CustomUserModel
 from django.conf import settings
@@ -55,10 +56,51 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, editable=False)
     created_date = models.DateTimeField(auto_now=True)
 
+    # Review stats, kept in sync by core/signals.py (rebuild with `manage.py rebuild_rating_stats`)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        # the index grid: ?sort=price keyset pages and ?min/?max, with and without ?subcategory
+        # (newest first per subcategory is served by the subcategory FK index, which ends in the rowid)
+        indexes = [
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['subcategory', 'price', 'id'], name='product_subcat_price_idx'),
+        ]
+
+    @staticmethod
+    def compute_price(mark_price, discount_percent):
+        # also used by bulk inserts that skip save() (generate_data)
+        return mark_price * (1 - discount_percent / 100)
+
+    # moved only with F() by core/ratings.py, a save() of this instance must not write them back
+    RATING_FIELDS = ('review_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+
     def save(self, *args, **kwargs):
-        self.price = self.mark_price * (1 - self.discount_percent / 100)
+        self.price = self.compute_price(self.mark_price, self.discount_percent)
+        if not self._state.adding and not args and kwargs.get('update_fields') is None \
+                and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_FIELDS
+            ]
         super().save(*args, **kwargs)
 
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return 0
+        return round(self.rating_sum / self.review_count, 1)
+
+    def rating_histogram(self):
+        """[(5, count), (4, count), ... (1, count)] for the star breakdown"""
+        return [(star, getattr(self, f'rating_{star}')) for star in range(5, 0, -1)]
+
     def __str__(self):
         return self.name
     
@@ -132,6 +174,14 @@ class BlogPost(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        # blog listing / recent posts, and the featured sidebar. Partial, because
+        # Django filters booleans as a bare `WHERE "is_published"`, which SQLite
+        # only matches against an index condition, never against an index column
+        indexes = [
+            models.Index(fields=['-created_at'], name='blogpost_published_idx', condition=Q(is_published=True)),
+            models.Index(fields=['-created_at'], name='blogpost_featured_idx',
+                         condition=Q(is_published=True, is_featured=True)),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -139,6 +189,9 @@ class BlogPost(models.Model):
         super().save(*args, **kwargs)
     
     def comment_count(self):
+        # listings annotate num_comments (see catalog_cache.blog_posts) to skip this query
+        if hasattr(self, 'num_comments'):
+            return self.num_comments
         return self.blogcomment_set.count()
     
     def __str__(self):
@@ -166,6 +219,7 @@ class Wishlist(models.Model):
     class Meta:
         unique_together = ('user', 'product')  # Prevent duplicate wishlist entries
         ordering = ['-added_date']
+        indexes = [models.Index(fields=['user', '-added_date'], name='wishlist_user_added_idx')]
     
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
\ No newline at end of file
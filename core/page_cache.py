@@ -0,0 +1,140 @@
+import hashlib
+import re
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+
+from . import catalog_cache
+
+
+'''
+Full page cache for anonymous visitors
+
+Whole rendered pages are cached per host, path and normalized querystring
+for visitors without a login or a cart. Entries carry the PAGES version they
+were rendered under; core/signals.py bumps it when catalog or blog content
+changes. An entry past PAGE_CACHE_TIMEOUT or from an older version is stale.
+It is still served for up to PAGE_CACHE_STALE more seconds while one request,
+the one that wins the lock, renders the page again (single flight). A miss
+with the lock taken waits briefly for that render instead of starting another.
+The CSRF tokens of the first render are swapped for a placeholder, and every
+hit gets its own visitor's token back in.
+The lock and the version only work across worker processes when the cache is
+shared (CACHE_IS_SHARED); with locmem each process renders and invalidates its
+own copies, and `check --deploy` warns about it (core/checks.py).
+'''
+
+PAGES = 'pages'
+
+# how long one render may hold the lock, and how long a miss waits for someone else's
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 3
+WAIT_STEP = 0.05
+
+# query parameters that never change what a page shows
+IGNORED_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|_)$')
+
+CSRF_INPUT = re.compile(rb'name="csrfmiddlewaretoken" value="([^"]+)"')
+CSRF_PLACEHOLDER = b'\x00csrf-token\x00'
+
+
+def page_key(request):
+    params = sorted(
+        (name, value) for name, values in request.GET.lists() if not IGNORED_PARAMS.match(name)
+        for value in values if value != ''
+    )
+    raw = f'{request.get_host()}{request.path}?{urlencode(params)}'
+    return f'page:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def is_cacheable(request):
+    """GET/HEAD from someone who sees the same page as everyone else"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        # logins and carts both live in the session
+        if request.user.is_authenticated or request.session.get(settings.CART_SESSION_ID):
+            return False
+    return True
+
+
+def _store(key, response, version):
+    # each {% csrf_token %} is masked differently, every one of them is the visitor's
+    content = CSRF_INPUT.sub(lambda match: match.group().replace(match.group(1), CSRF_PLACEHOLDER),
+                             response.content)
+    entry = {
+        'content': content,
+        'content_type': response['Content-Type'],
+        'version': version,
+        'expires': time.time() + settings.PAGE_CACHE_TIMEOUT,
+    }
+    cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_STALE)
+
+
+def _serve(request, entry, state):
+    content = entry['content']
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, content_type=entry['content_type'])
+    response['X-Page-Cache'] = state
+    return response
+
+
+def _wait_for(key, version):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            return entry
+    return None
+
+
+def cached_page(view):
+    """Serve `view` from the page cache to anonymous visitors, see above"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.PAGE_CACHE_TIMEOUT or not is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        key = page_key(request)
+        version = catalog_cache.get_version(PAGES)
+        entry = cache.get(key)
+        fresh = entry is not None and entry['version'] == version and entry['expires'] > time.time()
+        if fresh:
+            response = _serve(request, entry, 'HIT')
+        else:
+            lock = f'{key}:lock'
+            if cache.add(lock, 1, LOCK_TIMEOUT):
+                try:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code == 200 and not response.streaming:
+                        _store(key, response, version)
+                finally:
+                    cache.delete(lock)
+                response['X-Page-Cache'] = 'MISS'
+            elif entry is not None:
+                # someone else is rendering it, the old copy will do meanwhile
+                response = _serve(request, entry, 'STALE')
+            else:
+                entry = _wait_for(key, version)
+                if entry is not None:
+                    response = _serve(request, entry, 'HIT')
+                else:
+                    response = view(request, *args, **kwargs)
+                    response['X-Page-Cache'] = 'MISS'
+        # the same URL is rendered per visitor once a login or cart cookie turns up
+        patch_vary_headers(response, ['Cookie'])
+        return response
+    return wrapper
+
+
+def invalidate():
+    """Mark every cached page stale, they are re-rendered one at a time on their next hit"""
+    catalog_cache.bump_version(PAGES)
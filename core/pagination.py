@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+'''
+Keyset (cursor) pagination
+
+Instead of LIMIT/OFFSET + COUNT(*) we remember the sort key of the last row
+shown and ask for the rows after it, so page 50 costs the same as page 1.
+Cursors are opaque urlsafe base64 strings so users can't hand-edit them.
+'''
+
+# how long the approximate total of a filtered listing is kept in cache
+APPROX_TOTAL_TIMEOUT = 300
+
+
+def encode_cursor(values):
+    raw = json.dumps([str(v) for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, fields):
+    """Turn a cursor back into python values, None if it was tampered with"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def approximate_count(queryset, timeout=APPROX_TOTAL_TIMEOUT):
+    """
+    COUNT(*) of a listing, cached per SQL so we pay for it at most once
+    every few minutes instead of on every page.
+    """
+    key = 'approx_count:' + hashlib.md5(str(queryset.query).encode()).hexdigest()
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, timeout)
+    return total
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous,
+                 next_cursor=None, previous_cursor=None, approx_total=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.approx_total = approx_total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset on a unique ordering, eg ('-id',) or ('price', 'id').
+    The last field must be unique (normally id) so no row is skipped or repeated.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-id',), with_total=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.with_total = with_total
+
+        opts = queryset.model._meta
+        self.names = [o.lstrip('-') for o in self.ordering]
+        self.descending = [o.startswith('-') for o in self.ordering]
+        self.fields = [opts.pk if n in ('id', 'pk') else opts.get_field(n) for n in self.names]
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name in self.names]
+
+    def _seek(self, values, forward):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), spelled out so it works on every backend
+        condition = Q()
+        for i, name in enumerate(self.names):
+            # going forward on a descending field means "smaller than"
+            lookup = 'lt' if self.descending[i] == forward else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(self.names[:i], values[:i]):
+                term &= Q(**{prev_name: prev_value})
+            condition |= term
+        return condition
+
+    def page(self, after=None, before=None):
+        after_values = decode_cursor(after, self.fields) if after else None
+        before_values = decode_cursor(before, self.fields) if before else None
+
+        qs = self.queryset
+        if before_values is not None:
+            # walk backwards and flip the rows afterwards
+            reverse = [o[1:] if o.startswith('-') else '-' + o for o in self.ordering]
+            qs = qs.filter(self._seek(before_values, forward=False)).order_by(*reverse)
+            rows = list(qs[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            qs = qs.order_by(*self.ordering)
+            if after_values is not None:
+                qs = qs.filter(self._seek(after_values, forward=True))
+            rows = list(qs[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = after_values is not None
+
+        approx_total = approximate_count(self.queryset) if self.with_total else None
+
+        return KeysetPage(
+            rows,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=encode_cursor(self._key(rows[-1])) if rows else None,
+            previous_cursor=encode_cursor(self._key(rows[0])) if rows else None,
+            approx_total=approx_total,
+        )
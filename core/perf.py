@@ -0,0 +1,262 @@
+import contextvars
+import functools
+import logging
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+'''
+Per request performance budget
+
+PerfBudgetMiddleware counts SQL queries and times SQL, template rendering
+and the whole request. Each urls.py can declare QUERY_BUDGETS = {url name:
+max queries, or {method: max queries}}; a request over its budget is logged, and the test suites call
+assertWithinBudget() on seeded data so an N+1 fails CI instead of slipping in.
+Template time needs the TimedDjangoTemplates backend in settings.TEMPLATES.
+The same recorded statements go through SQLite's EXPLAIN QUERY PLAN in
+assertNoFullScans(), so a query that stops using its index fails too.
+'''
+
+_current = contextvars.ContextVar('perf_record', default=None)
+
+PERF_MIDDLEWARE = 'core.perf.PerfBudgetMiddleware'
+
+
+class PerfRecord:
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self.statements = []
+        self.url_name = None
+        self.budget = None
+        self.started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements.append((sql, params, many, context['connection'].alias))
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+    def server_timing(self):
+        return (f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries", '
+                f'tpl;dur={self.template_time * 1000:.1f}, '
+                f'total;dur={self.total_time * 1000:.1f}')
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        record = _current.get()
+        if record is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            record.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The regular Django engine, with top level renders timed into the current PerfRecord"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+@functools.cache
+def query_budgets():
+    """QUERY_BUDGETS of every urls.py included from the root URLconf, by url name"""
+    budgets = {}
+    for pattern in get_resolver().url_patterns:
+        module = getattr(pattern, 'urlconf_module', None)
+        budgets.update(getattr(module, 'QUERY_BUDGETS', {}))
+    return budgets
+
+
+def _dispatch(execute, sql, params, many, context):
+    # installed once on every connection, records into the current request's PerfRecord if any
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    return record(execute, sql, params, many, context)
+
+
+def install(connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+# connections opened later, eg. by the sync_to_async thread of an ASGI request; the record
+# follows the request there because asgiref copies the context
+connection_created.connect(install)
+
+
+class PerfBudgetMiddleware:
+    """
+    Sync and async capable, so under ASGI it does not push the whole chain onto
+    one thread. settings.py only installs it with PERF_BUDGETS or PERF_SERVER_TIMING.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        record, token = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(record, token)
+        return self._finish(request, response, record)
+
+    async def __acall__(self, request):
+        record, token = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(record, token)
+        return self._finish(request, response, record)
+
+    def _start(self):
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        record = PerfRecord()
+        record.started = time.perf_counter()
+        return record, _current.set(record)
+
+    def _stop(self, record, token):
+        record.total_time = time.perf_counter() - record.started
+        _current.reset(token)
+
+    def _finish(self, request, response, record):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            record.url_name = match.url_name
+            budget = query_budgets().get(match.url_name)
+            if isinstance(budget, dict):
+                budget = budget.get(request.method)
+            record.budget = budget
+        if record.over_budget:
+            logger.warning("%s ran %d queries, budget is %d (%s)",
+                           record.url_name, record.queries, record.budget, request.path)
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = record.server_timing()
+        response.perf = record
+        return response
+
+
+class BudgetTestMixin:
+    """For TestCase: self.assertWithinBudget(self.client.get(...)) on seeded data"""
+
+    def assertWithinBudget(self, response):
+        record = getattr(response, 'perf', None)
+        if record is None:
+            self.fail("No PerfRecord on the response, is PerfBudgetMiddleware installed?")
+        if record.budget is None:
+            self.fail(f"No query budget declared for url name {record.url_name!r} ({response.request['REQUEST_METHOD']})")
+        if record.over_budget:
+            self.fail(
+                f"{record.url_name} ran {record.queries} queries, budget is {record.budget}:\n"
+                + '\n'.join(f'{n}. {sql}' for n, (sql, *_) in enumerate(record.statements, 1))
+            )
+        return record
+
+
+'''  Query plans  '''
+# tables that grow with the catalog or with traffic, reading one end to end is a regression
+HOT_TABLES = (
+    'core_product', 'core_review', 'core_wishlist', 'core_blogpost', 'core_blogcomment',
+    'accounts_order', 'accounts_orderitem', 'payments_transaction',
+)
+
+# "SCAN core_product" without "USING ... INDEX" (older SQLite says "SCAN TABLE")
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+# the conditions of each WHERE in a statement (with any subqueries in them)
+WHERE = re.compile(r' WHERE (.*?)(?= GROUP BY | ORDER BY | LIMIT |$)', re.DOTALL)
+
+
+def query_plan(sql, params=None, using=DEFAULT_DB_ALIAS):
+    """SQLite's EXPLAIN QUERY PLAN lines for one statement"""
+    with connections[using].cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(sql, plan, tables=HOT_TABLES):
+    """
+    Which of `tables` the plan reads without an index. An unfiltered rowid walk
+    that needs no sort and has a LIMIT is fine, it stops after the page (newest
+    first listings); with a WHERE on the table it may read every row to fill it.
+    """
+    walk = ' LIMIT ' in sql and not any('TEMP B-TREE' in line for line in plan)
+    conditions = ' '.join(WHERE.findall(sql))
+    scanned = []
+    for match in map(FULL_SCAN.match, plan):
+        if not match or match.group(1) not in tables:
+            continue
+        if walk and f'"{match.group(2) or match.group(1)}".' not in conditions:
+            continue
+        scanned.append(match.group(1))
+    return scanned
+
+
+class QueryPlanTestMixin:
+    """For TestCase on SQLite, with PerfBudgetMiddleware installed"""
+
+    def _require_sqlite(self, using):
+        if connections[using].vendor != 'sqlite':
+            self.skipTest("Query plan checks read SQLite's EXPLAIN QUERY PLAN")
+
+    def assertNoFullScans(self, response, tables=HOT_TABLES):
+        """No SELECT the response ran reads one of `tables` end to end"""
+        problems = []
+        for sql, params, many, using in response.perf.statements:
+            if many or not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            self._require_sqlite(using)
+            plan = query_plan(sql, params, using)
+            if full_scans(sql, plan, tables):
+                problems.append(f"{sql}\n    {' | '.join(plan)}")
+        if problems:
+            self.fail(f"{response.perf.url_name} scans a whole table:\n" + '\n'.join(problems))
+
+    def assertUsesIndex(self, queryset, index, ordered=True):
+        """The queryset is answered from `index` (a name or prefix), and in index order unless ordered=False"""
+        self._require_sqlite(queryset.db)
+        sql, params = queryset.query.sql_with_params()
+        plan = query_plan(sql, params, queryset.db)
+        if not any(f'INDEX {index}' in line for line in plan):
+            self.fail(f"Not using {index}:\n{sql}\n    {' | '.join(plan)}")
+        if ordered and any('TEMP B-TREE FOR ORDER BY' in line for line in plan):
+            self.fail(f"{index} is used but the rows are sorted afterwards:\n{sql}\n    {' | '.join(plan)}")
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.db import connection
+from django.http import Http404
+
+from .catalog_cache import get_version, bump_version
+from .models import Product
+
+
+'''
+Product object cache
+
+Read-through cache of Product rows, gallery images included, keyed by id.
+Single products are dropped on Product/ProductImage save and delete and when
+review stats move (core/signals.py, core/ratings.py). Bulk changes that skip
+signals (update(), bulk_update) call forget_all(), which bumps the version in
+every key instead of deleting them one by one.
+'''
+
+PRODUCTS = 'product'
+PRODUCT_CACHE_TIMEOUT = 60 * 60
+
+
+def _key(version, pk):
+    return f'{PRODUCTS}:{version}:{pk}'
+
+
+def id_in_range(pk):
+    """`pk` fits the id column; the database raises OverflowError for bigger ones instead of finding nothing"""
+    low, high = connection.ops.integer_field_range(Product._meta.pk.get_internal_type())
+    return low <= pk <= high
+
+
+def get_many(ids):
+    """{id: Product} for the ids that exist, like in_bulk, one query for all the misses"""
+    # ids the column can't hold don't exist, rather than overflowing the query
+    ids = {pk for pk in map(int, ids) if id_in_range(pk)}
+    if not ids:
+        return {}
+    version = get_version(PRODUCTS)
+    keys = {_key(version, pk): pk for pk in ids}
+    products = {keys[key]: product for key, product in cache.get_many(keys).items()}
+
+    missing = ids - products.keys()
+    if missing:
+        loaded = Product.objects.prefetch_related('images').in_bulk(missing)
+        cache.set_many({_key(version, pk): product for pk, product in loaded.items()}, PRODUCT_CACHE_TIMEOUT)
+        products.update(loaded)
+    return products
+
+
+def get(pk):
+    """One product, raises Product.DoesNotExist like objects.get()"""
+    try:
+        return get_many([pk])[int(pk)]
+    except KeyError:
+        raise Product.DoesNotExist(f"Product {pk} does not exist")
+
+
+def get_or_404(pk):
+    try:
+        return get(pk)
+    except Product.DoesNotExist:
+        raise Http404("No Product matches the given query.")
+
+
+def forget(*pks):
+    version = get_version(PRODUCTS)
+    cache.delete_many([_key(version, pk) for pk in pks])
+
+
+def forget_all():
+    bump_version(PRODUCTS)
@@ -0,0 +1,58 @@
+from django.db.models import Count, F, Q, Sum
+
+from .models import Product
+from . import product_cache
+
+
+'''
+Denormalized review stats on Product
+
+review_count, rating_sum and the rating_1..rating_5 histogram are moved with
+F() expressions so concurrent reviews never overwrite each other.
+'''
+
+STARS = range(1, 6)
+
+
+def apply_review(product_id, rating, sign=1):
+    """Add (sign=1) or take away (sign=-1) one review of `rating` stars"""
+    changes = {
+        'review_count': F('review_count') + sign,
+        'rating_sum': F('rating_sum') + sign * rating,
+    }
+    if rating in STARS:
+        changes[f'rating_{rating}'] = F(f'rating_{rating}') + sign
+    Product.objects.filter(pk=product_id).update(**changes)
+    product_cache.forget(product_id)
+
+
+def rebuild_rating_stats(batch_size=1000):
+    """Recompute every product's stats from the review table, returns products updated"""
+    fields = list(Product.RATING_FIELDS)
+    stats = {
+        f'stat_{star}': Count('reviews', filter=Q(reviews__rating=star)) for star in STARS
+    }
+    queryset = Product.objects.annotate(
+        stat_count=Count('reviews'),
+        stat_sum=Sum('reviews__rating'),
+        **stats,
+    ).only('pk')
+
+    batch = []
+    updated = 0
+    for product in queryset.iterator(chunk_size=batch_size):
+        product.review_count = product.stat_count
+        product.rating_sum = product.stat_sum or 0
+        for star in STARS:
+            setattr(product, f'rating_{star}', getattr(product, f'stat_{star}'))
+        batch.append(product)
+        if len(batch) >= batch_size:
+            Product.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, fields)
+        updated += len(batch)
+    # bulk_update sends no signals
+    product_cache.forget_all()
+    return updated
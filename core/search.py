@@ -0,0 +1,159 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import strip_tags
+
+from .models import Product
+
+
+'''
+Product search
+
+On SQLite products are mirrored into an FTS5 virtual table (rowid = product id)
+created by migration 0012 and kept in sync by the signals in core/signals.py.
+Queries are ranked with BM25, name matches weigh the most.
+Other databases fall back to the old icontains lookup.
+'''
+
+FTS_TABLE = 'core_product_fts'
+
+# bm25 column weights: name, body, category, subcategory
+BM25_WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def build_match(query):
+    """
+    Turn what the user typed into an FTS5 MATCH expression.
+    Every word must appear, the last one as a prefix so search-as-you-type works.
+    Returns '' when there is nothing searchable.
+    """
+    tokens = TOKEN_RE.findall(query.lower())
+    if not tokens:
+        return ''
+    terms = ['"%s"' % t for t in tokens[:-1]]
+    terms.append('"%s"*' % tokens[-1])
+    return ' '.join(terms)
+
+
+def product_document(product):
+    """(name, body, category, subcategory) text for one product, html stripped"""
+    body = ' '.join(filter(None, [strip_tags(product.desc or ''), strip_tags(product.description or '')]))
+    return (
+        product.name,
+        body,
+        product.category.title if product.category_id else '',
+        product.subcategory.title if product.subcategory_id else '',
+    )
+
+
+def index_product(product):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, body, category, subcategory) VALUES (%s, %s, %s, %s, %s)',
+            [product.pk, *product_document(product)],
+        )
+
+
+def remove_product(product_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def reindex_products(queryset, batch_size=1000):
+    """(Re)index the given products in batches, returns how many were written"""
+    written = 0
+    queryset = queryset.select_related('category', 'subcategory').order_by('pk')
+    rows = []
+    with connection.cursor() as cursor:
+        for product in queryset.iterator(chunk_size=batch_size):
+            rows.append((product.pk, *product_document(product)))
+            if len(rows) >= batch_size:
+                written += _write_rows(cursor, rows)
+                rows = []
+        if rows:
+            written += _write_rows(cursor, rows)
+    return written
+
+
+def _write_rows(cursor, rows):
+    cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[r[0]] for r in rows])
+    cursor.executemany(
+        f'INSERT INTO {FTS_TABLE} (rowid, name, body, category, subcategory) VALUES (%s, %s, %s, %s, %s)',
+        rows,
+    )
+    return len(rows)
+
+
+def rebuild_index(batch_size=1000):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    return reindex_products(Product.objects.all(), batch_size=batch_size)
+
+
+class SearchResults:
+    """
+    Lazy, sliceable result set so it can go straight into Django's Paginator.
+    Only the requested page of ids is ranked out of FTS, then loaded in one query.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.match = build_match(query) if fts_enabled() else ''
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if not self.query:
+                self._count = 0
+            elif fts_enabled():
+                if not self.match:
+                    self._count = 0
+                else:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [self.match])
+                        self._count = cursor.fetchone()[0]
+            else:
+                self._count = self._fallback().count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = item.stop if item.stop is not None else self.count()
+        if not self.query or stop <= start:
+            return []
+        if not fts_enabled():
+            return list(self._fallback()[start:stop])
+        if not self.match:
+            return []
+
+        weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s',
+                [self.match, stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        products = Product.objects.in_bulk(ids)
+        return [products[i] for i in ids if i in products]
+
+    def _fallback(self):
+        return Product.objects.filter(
+            Q(name__icontains=self.query) |
+            Q(desc__icontains=self.query) |
+            Q(category__title__icontains=self.query) |
+            Q(subcategory__title__icontains=self.query)
+        ).distinct().order_by('-id')
@@ -0,0 +1,37 @@
+from django.contrib.sessions.backends import db
+
+
+'''
+Session store (SESSION_ENGINE = 'core.sessions', the default)
+
+The database backend, except that a save is skipped when the session data
+is the same as what was loaded, so a view that re-assigns an unchanged cart
+or re-sets the same expiry does not rewrite the row.
+core.cached_sessions puts the cache in front of it; settings.py only picks
+that one when CACHES is shared by every worker process, with a per process
+LocMemCache another worker would serve a stale session (a logout or cart
+change it never saw).
+'''
+
+
+class SkipUnchangedSaveMixin:
+
+    def _snapshot(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = super().load()
+        self._loaded = self._snapshot(data)
+        return data
+
+    def save(self, must_create=False):
+        loaded = getattr(self, '_loaded', None)
+        if (not must_create and self.session_key is not None and loaded is not None
+                and self._snapshot(self._session) == loaded):
+            return
+        super().save(must_create=must_create)
+        self._loaded = self._snapshot(self._session)
+
+
+class SessionStore(SkipUnchangedSaveMixin, db.SessionStore):
+    pass
@@ -0,0 +1,236 @@
+from decimal import Decimal
+
+from django.conf import settings
+
+from . import product_cache
+from .models import Product
+
+
+'''
+Compact session cart
+
+The session holds the cart as {"<product id>": quantity} plus a running
+summary {'lines', 'quantity', 'subtotal'} adjusted by every change. Names,
+prices and images are looked up from the catalog when the cart is shown
+(SessionCart.lines), so nothing in the session goes stale and each write
+stays small. Carts saved by django-shopping-cart as full dicts per line are
+converted on first read, and the session is only marked modified when a
+quantity actually changed.
+'''
+
+CART_SUMMARY_SESSION_ID = 'cart_summary'
+# most of one product per cart, far below what OrderItem.quantity (PositiveSmallIntegerField) holds
+MAX_LINE_QUANTITY = 99
+
+
+def compact(stored):
+    """{"5": 3} from either the compact form or django-shopping-cart's {"5": {"quantity": 3, ...}}"""
+    return {
+        str(key): min(int(value['quantity'] if isinstance(value, dict) else value), MAX_LINE_QUANTITY)
+        for key, value in (stored or {}).items()
+    }
+
+
+def summarize(quantities, products=None):
+    """Summary of a whole cart from catalog prices (product cache unless `products` is given)"""
+    if products is None:
+        products = product_cache.get_many(quantities)
+    lines = quantity = 0
+    subtotal = Decimal('0')
+    for key, qty in quantities.items():
+        product = products.get(int(key))
+        if product is None:
+            continue
+        lines += 1
+        quantity += qty
+        subtotal += product.price * qty
+    return {'lines': lines, 'quantity': quantity, 'subtotal': str(subtotal)}
+
+
+def get_summary(request):
+    """Item count and Decimal subtotal of the request's cart"""
+    if not request.user.is_authenticated:
+        return {'lines': 0, 'quantity': 0, 'subtotal': Decimal('0')}
+    stored = request.session.get(CART_SUMMARY_SESSION_ID)
+    if stored is None:
+        stored = SessionCart(request).summary
+    return {**stored, 'subtotal': Decimal(stored['subtotal'])}
+
+
+class SessionCart:
+
+    def __init__(self, request):
+        self.request = request
+        self.session = request.session
+        stored = self.session.get(settings.CART_SESSION_ID) or {}
+        self.cart = compact(stored)
+        summary = self.session.get(CART_SUMMARY_SESSION_ID)
+        # an old style cart or a missing summary is written back once
+        self._changed = self.cart != stored or summary is None
+        self.summary = summarize(self.cart) if self._changed else dict(summary)
+        self._resummarize = False
+        if self._changed:
+            self.save()
+
+    def _adjust(self, lines, quantity, amount):
+        self.summary['lines'] += lines
+        self.summary['quantity'] += quantity
+        self.summary['subtotal'] = str(Decimal(self.summary['subtotal']) + amount)
+
+    def save(self):
+        if self._resummarize:
+            self.summary = summarize(self.cart)
+            self._resummarize = False
+        if self._changed:
+            self.session[settings.CART_SESSION_ID] = self.cart
+            self.session[CART_SUMMARY_SESSION_ID] = self.summary
+            self._changed = False
+
+    def _set(self, key, quantity, product=None):
+        """Move line `key` to `quantity` (0 or less removes it, capped at MAX_LINE_QUANTITY), `product` gives the price"""
+        old = self.cart.get(key, 0)
+        quantity = min(max(quantity, 0), MAX_LINE_QUANTITY)
+        if quantity == old:
+            return
+        if quantity:
+            self.cart[key] = quantity
+        else:
+            del self.cart[key]
+        self._changed = True
+        if product is None:
+            # the product is gone from the catalog, recount from what is left
+            self._resummarize = True
+            return
+        self._adjust(bool(quantity) - bool(old), quantity - old, product.price * (quantity - old))
+
+    def quantity(self, product_id):
+        return self.cart.get(str(product_id), 0)
+
+    def add(self, product, quantity=1):
+        self._set(str(product.id), self.quantity(product.id) + quantity, product)
+        self.save()
+
+    def remove(self, product):
+        self._set(str(product.id), 0, product)
+        self.save()
+
+    def decrement(self, product):
+        # never below one, the line is removed with item_clear
+        if self.quantity(product.id) > 1:
+            self._set(str(product.id), self.quantity(product.id) - 1, product)
+            self.save()
+
+    def clear(self):
+        if self.cart:
+            self.cart = {}
+            self.summary = summarize(self.cart, {})
+            self._changed = True
+            self.save()
+
+    def lines(self, fresh=False):
+        """
+        [{'product', 'quantity', 'total'}] with current catalog prices from the product cache,
+        or with fresh=True straight from the database in one query (checkout: the cache is per
+        process and bulk price edits send no signals, so it may be behind).
+        Lines of deleted products are dropped and the summary is brought in line with the prices.
+        """
+        if fresh:
+            products = Product.objects.in_bulk([int(key) for key in self.cart])
+        else:
+            products = product_cache.get_many(self.cart)
+        lines = []
+        for key, quantity in list(self.cart.items()):
+            product = products.get(int(key))
+            if product is None:
+                del self.cart[key]
+                self._changed = True
+                continue
+            lines.append({'product': product, 'quantity': quantity, 'total': product.price * quantity})
+        summary = summarize(self.cart, products)
+        if summary != self.summary:
+            self.summary = summary
+            self._changed = True
+        self.save()
+        return lines
+
+    def apply(self, operations, products):
+        """
+        Run parsed operations (see parse_operations) against the cart, all or nothing.
+        `products` maps id -> Product for every referenced id that exists.
+        Returns the ids whose line changed.
+        """
+        # work out every resulting quantity first, the session is only touched if all are valid
+        quantities = {int(key): qty for key, qty in self.cart.items()}
+        steps = []
+        for index, (op, product_id, qty) in enumerate(operations):
+            if op == 'clear':
+                steps.extend((pid, 0) for pid in quantities)
+                quantities = {}
+                continue
+            if op == 'add':
+                qty += quantities.get(product_id, 0)
+            elif op == 'remove':
+                qty = 0
+            if qty > 0 and product_id not in products:
+                raise CartOperationError(f"Unknown product {product_id}", index)
+            if qty > MAX_LINE_QUANTITY:
+                raise CartOperationError(f"At most {MAX_LINE_QUANTITY} of a product per cart", index)
+            if qty > 0:
+                quantities[product_id] = qty
+            else:
+                quantities.pop(product_id, None)
+            steps.append((product_id, qty))
+
+        for product_id, qty in steps:
+            self._set(str(product_id), qty, products.get(product_id))
+        self.save()
+        return {product_id for product_id, qty in steps}
+
+
+class CartOperationError(ValueError):
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+CART_OPERATIONS = ('add', 'set', 'remove', 'clear')
+MAX_CART_OPERATIONS = 50
+
+
+def parse_operations(payload):
+    """
+    [{"op": "add", "product_id": 5, "qty": 2}, ...] -> [('add', 5, 2), ...]
+    add:    change the quantity by qty (default 1), a line at 0 or below is removed
+    set:    set the quantity to qty, 0 removes the line
+    remove: drop the line
+    clear:  empty the cart (no product_id)
+    """
+    if isinstance(payload, dict):
+        payload = payload.get('operations')
+    if not isinstance(payload, list) or not payload:
+        raise CartOperationError("Expected a non-empty list of operations")
+    if len(payload) > MAX_CART_OPERATIONS:
+        raise CartOperationError(f"At most {MAX_CART_OPERATIONS} operations per request")
+
+    operations = []
+    for index, item in enumerate(payload):
+        if not isinstance(item, dict) or item.get('op') not in CART_OPERATIONS:
+            raise CartOperationError(f"op must be one of {', '.join(CART_OPERATIONS)}", index)
+        op = item['op']
+        if op == 'clear':
+            operations.append((op, None, 0))
+            continue
+        product_id = item.get('product_id')
+        qty = item.get('qty', 1 if op == 'add' else 0)
+        # bool is an int subclass, "true" is not a quantity
+        if type(product_id) is not int or type(qty) is not int:
+            raise CartOperationError("product_id and qty must be integers", index)
+        if product_id < 1 or not product_cache.id_in_range(product_id):
+            raise CartOperationError("product_id is not a product id", index)
+        if op == 'set' and qty < 0:
+            raise CartOperationError("qty can not be negative", index)
+        if abs(qty) > MAX_LINE_QUANTITY:
+            raise CartOperationError(f"qty can not be over {MAX_LINE_QUANTITY}", index)
+        operations.append((op, product_id, qty))
+    return operations
@@ -0,0 +1,164 @@
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import (Category, SubCategory, Product, ProductImage, OfferProduct, Review,
+                     BlogPost, BlogCategory, BlogComment, Tag, Wishlist)
+from . import catalog_cache, conditional, page_cache, product_cache, ratings, search, thumbnails, wishlists
+
+
+'''  Search index sync  '''
+@receiver(post_save, sender=Product)
+def product_saved_index(sender, instance, raw=False, **kwargs):
+    # fixtures load before their categories exist, run rebuild_search_index after loaddata
+    if raw or not search.fts_enabled():
+        return
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted_index(sender, instance, **kwargs):
+    if search.fts_enabled():
+        search.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=SubCategory)
+def category_renamed_index(sender, instance, created, raw=False, **kwargs):
+    # category titles are searchable too, so their products need re-indexing
+    if created or raw or not search.fts_enabled():
+        return
+    if sender is Category:
+        search.reindex_products(Product.objects.filter(category=instance))
+    else:
+        search.reindex_products(Product.objects.filter(subcategory=instance))
+
+
+'''  Product object cache  '''
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed_cache(sender, instance, **kwargs):
+    product_cache.forget(instance.pk)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed_cache(sender, instance, **kwargs):
+    product_cache.forget(instance.product_id)
+
+
+'''  Review stats on Product  '''
+@receiver(post_init, sender=Review)
+def review_loaded(sender, instance, **kwargs):
+    # remember what was counted so an edit can move the right histogram bucket
+    instance._counted = (instance.__dict__.get('product_id'), instance.__dict__.get('rating'))
+
+
+@receiver(post_save, sender=Review)
+def review_saved_stats(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_product, old_rating = getattr(instance, '_counted', (None, None))
+    new = (instance.product_id, instance.rating)
+    if not created:
+        if (old_product, old_rating) == new:
+            return
+        if old_product is not None and old_rating is not None:
+            ratings.apply_review(old_product, old_rating, sign=-1)
+    ratings.apply_review(*new)
+    instance._counted = new
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted_stats(sender, instance, **kwargs):
+    counted = getattr(instance, '_counted', (None, None))
+    if None in counted:
+        counted = (instance.product_id, instance.rating)
+    ratings.apply_review(*counted, sign=-1)
+
+
+'''  Category sidebar cache  '''
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def catalog_changed_sidebar(sender, **kwargs):
+    catalog_cache.bump_version(catalog_cache.CATEGORY_TREE)
+
+
+'''  Blog sidebar cache  '''
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def blog_changed_sidebar(sender, **kwargs):
+    catalog_cache.bump_version(catalog_cache.BLOG_SIDEBAR)
+
+
+'''  Wishlist membership cache  '''
+@receiver(post_save, sender=Wishlist)
+@receiver(post_delete, sender=Wishlist)
+def wishlist_changed(sender, instance, **kwargs):
+    wishlists.forget(instance.user_id)
+
+
+'''  Page validators (conditional GET)  '''
+@receiver(post_init, sender=Review)
+def review_loaded_page(sender, instance, **kwargs):
+    instance._page_product = instance.__dict__.get('product_id')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_page_changed(sender, instance, **kwargs):
+    # a review moved to another product changes both pages
+    for product_id in {instance.product_id, getattr(instance, '_page_product', None)} - {None}:
+        conditional.touch('product', product_id)
+
+
+@receiver(post_save, sender=BlogComment)
+@receiver(post_delete, sender=BlogComment)
+def blog_post_page_changed(sender, instance, **kwargs):
+    conditional.touch('blogpost', instance.post_id)
+
+
+'''  Anonymous full page cache  '''
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=OfferProduct)
+@receiver(post_delete, sender=OfferProduct)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=BlogPost)
+@receiver(post_delete, sender=BlogPost)
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=BlogComment)
+@receiver(post_delete, sender=BlogComment)
+@receiver(m2m_changed, sender=BlogPost.tags.through)
+def content_changed_pages(sender, **kwargs):
+    page_cache.invalidate()
+
+
+'''  Responsive image derivatives  '''
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=OfferProduct)
+def catalog_image_saved(sender, instance, raw=False, **kwargs):
+    # generate() reads only the header when every derivative exists, re-saving an unchanged image is cheap
+    if not raw and instance.image:
+        thumbnails.schedule(instance.image.name)
@@ -0,0 +1,225 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+from . import css_bundle
+
+try:
+    import brotli
+except ImportError:  # optional, gzip alone still works
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+'''
+Static files: content hashed, precompressed, served in-process
+
+`collectstatic` with CompressedManifestStaticFilesStorage writes every file
+under a content hashed name (css/base.3f2a9c.css) and, next to each text
+asset, a gzip and (when the brotli package is installed) a brotli copy.
+StaticFilesMiddleware serves STATIC_ROOT straight from an index built once per
+process, before URL resolution: the best encoding the client accepts, ETags,
+and a year long immutable Cache-Control for hashed names (their URL changes
+whenever their content does). The site CSS bundle (core/css_bundle.py) is
+written out just before the hashing, so it goes through all of the above.
+'''
+
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.webmanifest', '.txt', '.xml', '.html', '.ico'}
+# a variant is only kept when it saves at least this much
+MIN_SAVING = 0.05
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# unhashed names (what {% static %} gives for files missing from the manifest) can change in place
+REVALIDATE = 'public, max-age=300'
+
+# (suffix, Content-Encoding) in order of preference
+ENCODINGS = (('.br', 'br'), ('.gz', 'gzip'))
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.')
+
+
+def compress(path):
+    """Write path.gz (and path.br) if they are worth it, returns the suffixes written"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    written = []
+    for suffix, compressed in variants.items():
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        # templates link a few stylesheets that are not in the repo and admin css
+        # points at source maps that are not shipped; keep their plain names
+        # instead of failing the page or the whole collectstatic
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            self.write_css_bundle(paths)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        hashed = set(self.hashed_files.values())
+        for name in sorted(hashed | set(paths)):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE and self.exists(name):
+                compress(self.path(name))
+
+
+    def write_css_bundle(self, paths):
+        """Collect css_bundle.BUNDLE and CRITICAL, before hashing so they get hashed too"""
+        def read(name):
+            if name not in paths:
+                return None
+            storage, path = paths[name]
+            with storage.open(path) as f:
+                return f.read().decode('utf-8')
+
+        for name, css in zip((css_bundle.BUNDLE, css_bundle.CRITICAL), css_bundle.build(read)):
+            if self.exists(name):
+                self.delete(name)
+            self.save(name, ContentFile(css.encode('utf-8')))
+            paths[name] = (self, name)
+
+
+class StaticFile:
+
+    def __init__(self, root, name):
+        self.path = os.path.join(root, name)
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self.last_modified = http_date(stat.st_mtime)
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.etag = '"%s"' % hashlib.md5(f'{name}:{stat.st_mtime_ns}:{self.size}'.encode()).hexdigest()
+        self.cache_control = IMMUTABLE if HASHED_NAME.search(name) else REVALIDATE
+        self.variants = {
+            encoding: (self.path + suffix, os.path.getsize(self.path + suffix))
+            for suffix, encoding in ENCODINGS if os.path.exists(self.path + suffix)
+        }
+
+
+def build_index(root):
+    index = {}
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            if filename.endswith(('.gz', '.br')) and os.path.exists(os.path.join(directory, filename[:-3])):
+                continue
+            name = os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, '/')
+            index[name] = StaticFile(root, name)
+    return index
+
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header, without the ones refused with q=0"""
+    accepted = set()
+    for part in header.split(','):
+        encoding, _, params = part.strip().partition(';')
+        q = re.search(r'q=([0-9.]+)', params)
+        if not q or float(q.group(1)) > 0:
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Serves STATIC_URL out of STATIC_ROOT ahead of the URL resolver, see above.
+    Sync and async capable like PerfBudgetMiddleware (core/perf.py).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        self._index = None
+        self._lock = threading.Lock()
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    root = settings.STATIC_ROOT
+                    self._index = build_index(root) if root and os.path.isdir(root) else {}
+                    logger.debug("Indexed %d static files in %s", len(self._index), root)
+        return self._index
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        static = self.lookup(request)
+        if static is not None:
+            return self.serve(request, static)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self._index is None and self.is_static(request):
+            # walking STATIC_ROOT happens once, off the event loop
+            await sync_to_async(lambda: self.index)()
+        static = self.lookup(request)
+        if static is not None:
+            return self.serve(request, static)
+        return await self.get_response(request)
+
+    def is_static(self, request):
+        return request.path_info.startswith(self.prefix) and request.method in ('GET', 'HEAD')
+
+    def lookup(self, request):
+        if self.is_static(request):
+            return self.index.get(request.path_info[len(self.prefix):])
+        return None
+
+    def serve(self, request, static):
+        path, size, encoding = static.path, static.size, None
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for _, candidate in ENCODINGS:
+            if candidate in static.variants and candidate in accepted:
+                (path, size), encoding = static.variants[candidate], candidate
+                break
+        etag = static.etag if encoding is None else f'{static.etag[:-1]}-{encoding}"'
+
+        if etag in (tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static.content_type)
+            # it would be named after the file opened, which may be the .br/.gz variant
+            del response['Content-Disposition']
+            response['Content-Length'] = size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = static.last_modified
+        response['Cache-Control'] = static.cache_control
+        if static.variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
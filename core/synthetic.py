@@ -0,0 +1,328 @@
+import io
+import random
+import time
+from array import array
+from decimal import Decimal
+
+from PIL import Image
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import slugify
+
+from accounts.models import CustomUserModel, Order, OrderItem
+from payments.models import Transaction
+from . import catalog_cache, product_cache, search
+from .models import (OfferProduct, Category, SubCategory, Product, ProductImage, Review, Wishlist,
+                     BlogPost, BlogCategory, BlogComment, Tag)
+from .ratings import rebuild_rating_stats
+
+
+'''
+Synthetic store data for load tests (`python manage.py generate_data`)
+
+Rows go in with bulk_create in batches, one transaction per table. What the
+models' save() would compute is computed here the same way: Product.price
+through Product.compute_price, slugs from lowercase ascii words joined with
+"-" (exactly what slugify gives for them, checked on the first row), review
+stats, search index and caches rebuilt at the end.
+Each table draws from its own Random(f"{seed}:{table}"), so the same seed and
+sizes always give the same data, and changing one size does not reshuffle
+the other tables. Needs a backend that returns primary keys from bulk_create
+(SQLite 3.35+, PostgreSQL).
+'''
+
+ADJECTIVES = (
+    'amber', 'bold', 'calm', 'crisp', 'dusky', 'eager', 'fresh', 'gentle', 'golden', 'handy',
+    'ivory', 'jolly', 'keen', 'lively', 'mellow', 'noble', 'olive', 'plush', 'quiet', 'rustic',
+    'silver', 'tidy', 'urban', 'vivid', 'warm', 'young', 'zesty', 'classic', 'compact', 'deluxe',
+)
+NOUNS = (
+    'backpack', 'blender', 'candle', 'chair', 'jacket', 'kettle', 'lamp', 'mug', 'notebook', 'pillow',
+    'sandal', 'scarf', 'shirt', 'sneaker', 'speaker', 'teapot', 'towel', 'umbrella', 'wallet', 'watch',
+    'headphones', 'bottle', 'blanket', 'mirror', 'planter', 'rug', 'stool', 'tray', 'vase', 'wok',
+)
+DISCOUNTS = (0, 0, 0, 5, 10, 10, 15, 20, 25, 30, 50)
+RATING_WEIGHTS = (4, 6, 15, 35, 40)  # 1..5 stars, skewed the way real reviews are
+
+DEFAULT_SIZES = {
+    'users': 1000,
+    'categories': 8,
+    'subcategories': 5,  # per category
+    'products': 10000,
+    'images': 2,  # gallery images per product
+    'offers': 5,
+    'reviews': 50000,
+    'wishlists': 20000,
+    'blog_categories': 6,
+    'tags': 40,
+    'posts': 500,
+    'comments': 5000,
+    'orders': 20000,
+    'items': 4,  # most lines per order
+}
+
+# scaled by --scale, the rest are shape rather than volume
+SCALED = ('users', 'products', 'reviews', 'wishlists', 'posts', 'comments', 'orders')
+
+PLACEHOLDERS = 8
+
+
+def product_name(index):
+    """Names are a pure function of the index, so order lines can repeat them without a lookup"""
+    adjective = ADJECTIVES[index % len(ADJECTIVES)]
+    noun = NOUNS[(index // len(ADJECTIVES)) % len(NOUNS)]
+    return f'{adjective.capitalize()} {noun} {index}'
+
+
+def sentence(rng, words=12):
+    text = ' '.join(rng.choice(ADJECTIVES + NOUNS) for _ in range(words))
+    return text.capitalize() + '.'
+
+
+class DataGenerator:
+
+    def __init__(self, sizes=None, seed=0, prefix='load', batch_size=5000, password='loadtest',
+                 write_images=True, log=print):
+        self.sizes = {**DEFAULT_SIZES, **(sizes or {})}
+        self.seed = seed
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.password = password
+        self.write_images = write_images
+        self.log = log
+
+    def rng(self, table):
+        return random.Random(f'{self.seed}:{table}')
+
+    def slug(self, *parts):
+        # slugify() of "Prefix word word 12" is exactly this for lowercase ascii words
+        return '-'.join([self.prefix, *parts]).lower()
+
+    def _check_slug(self, title, slug):
+        if slugify(title) != slug:
+            raise ValueError(f"Generated slug {slug!r} does not match slugify({title!r})")
+
+    def _insert(self, model, rows, label=None):
+        """bulk_create `rows` in batches, returns the new primary keys in insert order"""
+        ids = array('q')
+        batch = []
+        start = time.perf_counter()
+
+        def flush():
+            model.objects.bulk_create(batch)
+            if batch[0].pk is None:
+                raise RuntimeError("This database does not return ids from bulk_create")
+            ids.extend(obj.pk for obj in batch)
+            batch.clear()
+
+        with transaction.atomic():
+            for obj in rows:
+                batch.append(obj)
+                if len(batch) >= self.batch_size:
+                    flush()
+            if batch:
+                flush()
+        self.log(f"{label or model._meta.verbose_name_plural}: {len(ids)} rows in {time.perf_counter() - start:.1f}s")
+        return ids
+
+    def _pairs(self, rng, left, right, count):
+        """`count` distinct (left id, right id) pairs, for unique_together style rows"""
+        count = min(count, len(left) * len(right))
+        for n in rng.sample(range(len(left) * len(right)), count):
+            yield left[n // len(right)], right[n % len(right)]
+
+    '''  Tables  '''
+    def placeholders(self):
+        rng = self.rng('placeholders')
+        names = []
+        for n in range(PLACEHOLDERS):
+            name = f'images/generated/{self.prefix}-{n}.jpg'
+            names.append(name)
+            if self.write_images and not default_storage.exists(name):
+                color = tuple(rng.randrange(40, 220) for _ in range(3))
+                buffer = io.BytesIO()
+                Image.new('RGB', (1200, 900), color).save(buffer, 'JPEG', quality=85)
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+        return names
+
+    def username(self, n):
+        return f'{self.prefix}user{n}'
+
+    def users(self):
+        password = make_password(self.password)  # hashing once instead of per user
+        rng = self.rng('users')
+
+        def rows():
+            for n in range(self.sizes['users']):
+                yield CustomUserModel(
+                    username=self.username(n), email=f'{self.username(n)}@example.com',
+                    password=password, first_name=rng.choice(ADJECTIVES).capitalize(),
+                    phone=f'98{rng.randrange(10 ** 8):08d}', street_address=f'{rng.randrange(1, 500)} {rng.choice(NOUNS)} street',
+                )
+        return self._insert(CustomUserModel, rows(), 'users')
+
+    def catalog(self, images):
+        rng = self.rng('catalog')
+        categories = self._insert(Category, (
+            Category(title=f'{rng.choice(ADJECTIVES).capitalize()} {rng.choice(NOUNS)}s {n}')
+            for n in range(self.sizes['categories'])
+        ), 'categories')
+        parents = [categories[n // self.sizes['subcategories']]
+                   for n in range(len(categories) * self.sizes['subcategories'])]
+        subcategories = self._insert(SubCategory, (
+            SubCategory(title=f'{rng.choice(ADJECTIVES).capitalize()} {rng.choice(NOUNS)} {n}', category_id=parent)
+            for n, parent in enumerate(parents)
+        ), 'subcategories')
+
+        rng = self.rng('products')
+        self.prices = array('q')  # in paisa, for order lines
+
+        def products():
+            for n in range(self.sizes['products']):
+                sub = rng.randrange(len(subcategories))
+                mark_price = Decimal(rng.randrange(200, 50000))
+                discount = Decimal(rng.choice(DISCOUNTS))
+                price = Product.compute_price(mark_price, discount)
+                self.prices.append(int(price * 100))
+                yield Product(
+                    name=product_name(n), category_id=parents[sub], subcategory_id=subcategories[sub],
+                    desc=f'<p>{sentence(rng, 10)}</p>', description=f'<p>{sentence(rng, 40)}</p>',
+                    image=rng.choice(images), mark_price=mark_price, discount_percent=discount, price=price,
+                )
+        products = self._insert(Product, products())
+
+        rng = self.rng('product_images')
+        self._insert(ProductImage, (
+            ProductImage(product_id=product, image=rng.choice(images))
+            for product in products for _ in range(self.sizes['images'])
+        ))
+        rng = self.rng('offers')
+        self._insert(OfferProduct, (
+            OfferProduct(title=f'{rng.choice(DISCOUNTS[3:])}% off {product_name(n)}', desc=sentence(rng),
+                         image=rng.choice(images), product_id=products[n])
+            for n in rng.sample(range(len(products)), min(self.sizes['offers'], len(products)))
+        ), 'offers')
+        return products
+
+    def reviews(self, users, products):
+        rng = self.rng('reviews')
+        self._insert(Review, (
+            Review(product_id=product, user_id=user, feedback=sentence(rng),
+                   rating=rng.choices(range(1, 6), RATING_WEIGHTS)[0])
+            for product, user in self._pairs(rng, products, users, self.sizes['reviews'])
+        ))
+
+    def wishlists(self, users, products):
+        rng = self.rng('wishlists')
+        self._insert(Wishlist, (
+            Wishlist(user_id=user, product_id=product)
+            for user, product in self._pairs(rng, users, products, self.sizes['wishlists'])
+        ))
+
+    def blog(self, users, images):
+        rng = self.rng('blog')
+
+        def named(model, count, label):
+            rows = []
+            for n in range(count):
+                word = rng.choice(ADJECTIVES)
+                title = f'{self.prefix.capitalize()} {word} {n}'
+                rows.append(model(name=title, slug=self.slug(word, str(n))))
+            if rows:
+                self._check_slug(rows[0].name, rows[0].slug)
+            return self._insert(model, rows, label)
+
+        blog_categories = named(BlogCategory, self.sizes['blog_categories'], 'blog categories')
+        tags = named(Tag, self.sizes['tags'], 'tags')
+
+        def posts():
+            for n in range(self.sizes['posts']):
+                words = [rng.choice(ADJECTIVES), rng.choice(NOUNS)]
+                title = f"{self.prefix.capitalize()} {' '.join(words)} {n}"
+                slug = self.slug(*words, str(n))
+                if n == 0:
+                    self._check_slug(title, slug)
+                yield BlogPost(
+                    title=title, slug=slug, author_id=rng.choice(users), featured_image=rng.choice(images),
+                    category_id=rng.choice(blog_categories) if blog_categories else None,
+                    excerpt=sentence(rng, 20)[:300], content=''.join(f'<p>{sentence(rng, 60)}</p>' for _ in range(4)),
+                    views=rng.randrange(5000), is_featured=rng.random() < 0.05,
+                )
+        posts = self._insert(BlogPost, posts(), 'blog posts')
+
+        if tags:
+            self._insert(BlogPost.tags.through, (
+                BlogPost.tags.through(blogpost_id=post, tag_id=tag)
+                for post in posts for tag in rng.sample(tags, min(len(tags), rng.randint(1, 4)))
+            ), 'post tags')
+        self._insert(BlogComment, (
+            BlogComment(post_id=rng.choice(posts), author_id=rng.choice(users), content=sentence(rng))
+            for _ in range(self.sizes['comments'] if posts else 0)
+        ), 'blog comments')
+
+    def orders(self, users, products):
+        rng = self.rng('orders')
+        start = time.perf_counter()
+        total_orders = total_items = 0
+        with transaction.atomic():
+            remaining = self.sizes['orders']
+            while remaining > 0:
+                count = min(remaining, self.batch_size)
+                remaining -= count
+                orders, lines, usernames = [], [], []
+                for _ in range(count):
+                    picks = rng.sample(range(len(products)), min(len(products), rng.randint(1, self.sizes['items'])))
+                    order_lines = []
+                    for index in picks:
+                        price = Decimal(self.prices[index]) / 100
+                        quantity = rng.randint(1, 3)
+                        order_lines.append(OrderItem(product_id=products[index], name=product_name(index),
+                                                     price=price, quantity=quantity, total=price * quantity))
+                    # users are inserted in order, users[n] is username(n)
+                    user = rng.randrange(len(users))
+                    usernames.append(self.username(user))
+                    orders.append(Order(user_id=users[user], phone=f'98{rng.randrange(10 ** 8):08d}',
+                                        address=f'{rng.randrange(1, 500)} {rng.choice(NOUNS)} street',
+                                        total=sum(line.total for line in order_lines), is_pay=rng.random() < 0.6))
+                    lines.append(order_lines)
+                Order.objects.bulk_create(orders)
+
+                items, payments = [], []
+                for order, order_lines, username in zip(orders, lines, usernames):
+                    for line in order_lines:
+                        line.order_id = order.pk
+                        items.append(line)
+                    if order.is_pay:
+                        payments.append(Transaction(order_id=order.pk, user=username,
+                                                    transaction_id=f'{self.prefix}{order.pk}', total=str(order.total)))
+                OrderItem.objects.bulk_create(items, batch_size=self.batch_size)
+                Transaction.objects.bulk_create(payments, batch_size=self.batch_size)
+                total_orders += len(orders)
+                total_items += len(items)
+        self.log(f"orders: {total_orders} orders, {total_items} lines in {time.perf_counter() - start:.1f}s")
+
+    def run(self):
+        if CustomUserModel.objects.filter(username__startswith=self.username('')).exists():
+            raise ValueError(f"Data with prefix {self.prefix!r} exists already, pick another --prefix")
+        images = self.placeholders()
+        users = self.users()
+        products = self.catalog(images)
+        if users:
+            self.reviews(users, products)
+            self.wishlists(users, products)
+            self.blog(users, images)
+            if products:
+                self.orders(users, products)
+
+        # what the signals would have kept up to date row by row
+        start = time.perf_counter()
+        with transaction.atomic():
+            rebuild_rating_stats(batch_size=self.batch_size)
+            if search.fts_enabled():
+                search.rebuild_index(batch_size=self.batch_size)
+        catalog_cache.bump_version(catalog_cache.CATEGORY_TREE)
+        catalog_cache.bump_version(catalog_cache.BLOG_SIDEBAR)
+        product_cache.forget_all()
+        self.log(f"rating stats, search index and caches rebuilt in {time.perf_counter() - start:.1f}s")
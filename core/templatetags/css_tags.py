@@ -0,0 +1,43 @@
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from core.css_bundle import BUNDLE, CRITICAL, SOURCES
+
+register = template.Library()
+
+# critical css per collected (hashed) name, it only changes with a new collectstatic
+_critical = {}
+
+
+def _read_critical():
+    name = staticfiles_storage.stored_name(CRITICAL)
+    if name not in _critical:
+        with staticfiles_storage.open(name) as f:
+            _critical[name] = f.read().decode('utf-8')
+    return _critical[name]
+
+
+@register.simple_tag
+def site_stylesheets():
+    """
+    {% site_stylesheets %}
+    The critical rules inline and the collected bundle loaded without blocking
+    the first paint (core/css_bundle.py), or a plain <link> per source while
+    there is no bundle.
+    """
+    manifest = getattr(staticfiles_storage, 'hashed_files', {})
+    if settings.DEBUG or BUNDLE not in manifest or CRITICAL not in manifest:
+        return format_html_join('\n', '<link href="{}" rel="stylesheet">', ((static(name),) for name in SOURCES))
+
+    url = static(BUNDLE)
+    return format_html(
+        '<style>{}</style>\n'
+        '<link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        '<noscript><link href="{}" rel="stylesheet"></noscript>',
+        # css, not html: escaping it would break quoted values
+        mark_safe(_read_critical()), url, url,
+    )
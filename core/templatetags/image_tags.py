@@ -0,0 +1,36 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from core.thumbnails import FORMATS, available_widths, derivative_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', loading='lazy', **attrs):
+    """
+    {% responsive_image product.image sizes="(max-width: 576px) 100vw, 33vw" class="card-img-top" alt=product.name %}
+    A <picture> with WebP and JPEG srcsets of the generated widths (core/thumbnails.py),
+    or a plain <img> of the original while there are none.
+    """
+    if not image:
+        return ''
+    extra = format_html_join('', ' {}="{}"', sorted(attrs.items()))
+    widths = available_widths(image.name)
+    if not widths:
+        return format_html('<img src="{}" loading="{}" decoding="async"{}>', image.url, loading, extra)
+
+    srcsets = {
+        ext: ', '.join(f'{default_storage.url(derivative_name(image.name, width, ext))} {width}w' for width in widths)
+        for ext, _, _ in FORMATS
+    }
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((mime, srcsets[ext], sizes) for ext, _, mime in FORMATS if ext != 'jpg'),
+    )
+    largest = default_storage.url(derivative_name(image.name, widths[-1], 'jpg'))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" loading="{}" decoding="async"{}></picture>',
+        sources, largest, srcsets['jpg'], sizes, loading, extra,
+    )
@@ -0,0 +1,19 @@
+from django import template
+
+from core.wishlists import wishlist_ids as cached_wishlist_ids
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def wishlist_ids(context):
+    """
+    {% wishlist_ids as wished %} then {% if i.id in wished %} per card.
+    Looked up once per request, however many grids or cards use it.
+    """
+    request = context.get('request')
+    if request is None:
+        return frozenset()
+    if not hasattr(request, '_wishlist_ids'):
+        request._wishlist_ids = cached_wishlist_ids(request.user)
+    return request._wishlist_ids
@@ -1,3 +1,778 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.middleware.csrf import _unmask_cipher_token, get_token
+from django.http import HttpResponse
+from django.contrib.staticfiles import finders
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils.text import slugify
+
+from accounts.models import CustomUserModel, Order
+from core import checks, css_bundle, media, page_cache, search, staticfiles
+from core.counters import BufferedCounter
+from core.synthetic import DataGenerator
+from core.catalog_cache import CATEGORY_TREE, blog_posts, bump_version
+from core.pagination import KeysetPaginator, encode_cursor
+from core.perf import BudgetTestMixin, QueryPlanTestMixin, full_scans, query_plan
+from payments.models import Transaction
+from .models import (OfferProduct, Category, SubCategory, Product, ProductImage, Review, Wishlist,
+                     BlogPost, BlogCategory, BlogComment, Tag)
+
+
+def make_user(username):
+    user = CustomUserModel(username=username, email=f'{username}@example.com', phone='9800000000',
+                           street_address='Kathmandu')
+    user.set_unusable_password()
+    user.save()
+    return user
+
+
+def seed_catalog(products_per_subcategory=6):
+    """Enough rows that a query per product, review or post is far over any budget"""
+    users = [make_user(f'shopper{n}') for n in range(6)]
+    products = []
+    for c in range(3):
+        category = Category.objects.create(title=f'Category {c}')
+        for s in range(2):
+            subcategory = SubCategory.objects.create(title=f'Sub {c}.{s}', category=category)
+            for p in range(products_per_subcategory):
+                products.append(Product.objects.create(
+                    name=f'Product {c}.{s}.{p}', category=category, subcategory=subcategory,
+                    desc='<p>desc</p>', description='<p>description</p>', image='images/product.png',
+                    mark_price=Decimal(100 + p), discount_percent=Decimal(10),
+                ))
+    for product in products[:4]:
+        for n in range(3):
+            ProductImage.objects.create(product=product, image=f'images/gallery{n}.png')
+        for user in users:
+            Review.objects.create(product=product, user=user, rating=1 + len(product.name) % 5, feedback='ok')
+    for product in products[:3]:
+        OfferProduct.objects.create(title=f'Offer {product.name}', desc='offer', image='offers/offer.png',
+                                    product=product)
+
+    blog_category = BlogCategory.objects.create(name='News')
+    tags = [Tag.objects.create(name=f'tag{n}') for n in range(4)]
+    posts = []
+    for n in range(8):
+        post = BlogPost.objects.create(title=f'Post {n}', author=users[n % len(users)], category=blog_category,
+                                       excerpt='excerpt', content='<p>content</p>', is_featured=n < 3,
+                                       featured_image='blog/post.png')
+        post.tags.set(tags[:1 + n % 4])
+        for user in users[:3]:
+            BlogComment.objects.create(post=post, author=user, content='nice')
+        posts.append(post)
+    return users, products, posts
+
+
+class ViewQueryBudgetTests(BudgetTestMixin, TestCase):
+    """Every core page stays within its QUERY_BUDGETS entry (core/urls.py) on a cold cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.products, cls.posts = seed_catalog()
+        cls.user = cls.users[0]
+        for product in cls.products[:5]:
+            Wishlist.objects.create(user=cls.user, product=product)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        self.client.force_login(self.user)
+
+    def fill_cart(self):
+        session = self.client.session
+        session['cart'] = {str(product.id): 2 for product in self.products[:6]}
+        session.save()
+
+    def test_index(self):
+        self.assertWithinBudget(self.client.get(reverse('index')))
+
+    def test_index_logged_in(self):
+        self.login()
+        self.fill_cart()
+        self.assertWithinBudget(self.client.get(reverse('index')))
+
+    def test_index_filtered_next_page(self):
+        first = self.client.get(reverse('index'), {'sort': 'price'})
+        cursor = first.context['data'].next_cursor
+        self.assertWithinBudget(self.client.get(reverse('index'), {'sort': 'price', 'after': cursor}))
+
+    def test_blog(self):
+        self.assertWithinBudget(self.client.get(reverse('blog')))
+
+    def test_blog_detail(self):
+        self.assertWithinBudget(self.client.get(reverse('blog_detail', args=[self.posts[0].slug])))
+
+    def test_about_us(self):
+        self.assertWithinBudget(self.client.get(reverse('about_us')))
+
+    def test_contact(self):
+        self.assertWithinBudget(self.client.get(reverse('contact')))
+
+    def test_search(self):
+        self.assertWithinBudget(self.client.get(reverse('search'), {'q': 'Product'}))
+
+    def test_product_detail(self):
+        self.login()
+        self.assertWithinBudget(self.client.get(reverse('product_detail', args=[self.products[0].id])))
+
+    def test_product_reviews(self):
+        response = self.client.get(reverse('product_reviews', args=[self.products[0].id]))
+        self.assertWithinBudget(response)
+
+    def test_cart_detail(self):
+        self.login()
+        self.fill_cart()
+        self.assertWithinBudget(self.client.get(reverse('cart_detail')))
+
+    def test_cart_add(self):
+        self.login()
+        self.fill_cart()
+        self.assertWithinBudget(self.client.get(reverse('cart_add', args=[self.products[10].id])))
+
+    def test_cart_item_views(self):
+        self.login()
+        self.fill_cart()
+        product = self.products[0]
+        for name in ('item_increment', 'item_decrement', 'item_clear'):
+            self.assertWithinBudget(self.client.get(reverse(name, args=[product.id])))
+        self.assertWithinBudget(self.client.get(reverse('cart_clear')))
+
+    def test_cart_api(self):
+        self.login()
+        self.fill_cart()
+        operations = [{'op': 'add', 'product_id': product.id, 'qty': 1} for product in self.products[:10]]
+        response = self.client.post(reverse('cart_api'), {'operations': operations}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+
+        # quantities OrderItem.quantity could not hold are refused, also when reached in steps
+        too_many = [{'op': 'set', 'product_id': self.products[0].id, 'qty': 40000}]
+        response = self.client.post(reverse('cart_api'), {'operations': too_many}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        steps = [{'op': 'add', 'product_id': self.products[0].id, 'qty': 60}] * 2
+        response = self.client.post(reverse('cart_api'), {'operations': steps}, content_type='application/json')
+        self.assertEqual(response.json()['index'], 1)
+
+    def test_wishlist(self):
+        self.login()
+        self.assertWithinBudget(self.client.get(reverse('wishlist')))
+
+    def test_wishlist_mutations(self):
+        self.login()
+        product = self.products[7]
+        self.assertWithinBudget(self.client.post(reverse('add_to_wishlist', args=[product.id])))
+        self.assertWithinBudget(self.client.post(reverse('toggle_wishlist', args=[product.id])))
+        self.assertWithinBudget(self.client.post(reverse('toggle_wishlist', args=[product.id])))
+        self.assertWithinBudget(self.client.post(reverse('remove_from_wishlist', args=[product.id])))
+
+    def test_wishlist_messages_name_the_product(self):
+        self.login()
+        product = self.products[7]
+        response = self.client.post(reverse('add_to_wishlist', args=[product.id]),
+                                    headers={'X-Requested-With': 'XMLHttpRequest'})
+        self.assertEqual(response.json()['message'], f"{product.name} added to wishlist!")
+        response = self.client.post(reverse('remove_from_wishlist', args=[product.id]), follow=True)
+        self.assertIn(f"{product.name} removed from your wishlist.", [str(m) for m in response.context['messages']])
+        self.assertEqual(self.client.post(reverse('remove_from_wishlist', args=[10 ** 6])).status_code, 404)
+
+
+class CartApiTests(TestCase):
+    """The batched cart endpoint (core/views.py cart_api, core/shopping_cart.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, cls.products, _ = seed_catalog(products_per_subcategory=1)
+        cls.user = make_user('carter')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, *operations):
+        return self.client.post(reverse('cart_api'), {'operations': list(operations)}, content_type='application/json')
+
+    def cart(self):
+        return self.client.session.get('cart', {})
+
+    def test_lines_and_summary(self):
+        first, second = self.products[:2]
+        response = self.post({'op': 'add', 'product_id': first.id, 'qty': 2},
+                             {'op': 'set', 'product_id': second.id, 'qty': 3},
+                             {'op': 'add', 'product_id': first.id})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual({pk: (line['quantity'], Decimal(line['total'])) for pk, line in data['lines'].items()},
+                         {str(first.id): (3, first.price * 3), str(second.id): (3, second.price * 3)})
+        summary = data['summary']
+        self.assertEqual((summary['lines'], summary['quantity'], Decimal(summary['subtotal'])),
+                         (2, 6, first.price * 3 + second.price * 3))
+        self.assertEqual(self.cart(), {str(first.id): 3, str(second.id): 3})
+
+    def test_set_remove_clear(self):
+        first, second, third = self.products[:3]
+        self.post(*({'op': 'add', 'product_id': product.id} for product in (first, second, third)))
+        data = self.post({'op': 'set', 'product_id': first.id, 'qty': 0},
+                         {'op': 'remove', 'product_id': second.id}).json()
+        self.assertEqual(data['lines'][str(first.id)], {'quantity': 0, 'total': '0'})
+        self.assertEqual(self.cart(), {str(third.id): 1})
+        summary = data['summary']
+        self.assertEqual((summary['lines'], summary['quantity'], Decimal(summary['subtotal'])), (1, 1, third.price))
+
+        data = self.post({'op': 'clear'}).json()
+        self.assertEqual(self.cart(), {})
+        self.assertEqual(data['summary']['lines'], 0)
+
+    def test_failed_batch_changes_nothing(self):
+        first = self.products[0]
+        self.post({'op': 'add', 'product_id': first.id})
+        before = (self.cart(), self.client.session.get('cart_summary'))
+        response = self.post({'op': 'add', 'product_id': first.id, 'qty': 5},
+                             {'op': 'add', 'product_id': 10 ** 6})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['index'], 1)
+        self.assertIn('Unknown product', response.json()['message'])
+        self.assertEqual((self.cart(), self.client.session.get('cart_summary')), before)
+
+    def test_ids_beyond_the_id_column_are_404(self):
+        huge = 10 ** 20
+        for name in ('product_detail', 'product_reviews', 'cart_add', 'item_clear', 'item_increment', 'item_decrement'):
+            with self.subTest(name):
+                self.assertEqual(self.client.get(reverse(name, args=[huge])).status_code, 404)
+        for name in ('add_to_wishlist', 'remove_from_wishlist', 'toggle_wishlist'):
+            with self.subTest(name):
+                self.assertEqual(self.client.post(reverse(name, args=[huge])).status_code, 404)
+
+    def test_bad_product_ids(self):
+        for product_id in (10 ** 20, -(10 ** 20), 0, -1, '1', True, None):
+            with self.subTest(product_id=product_id):
+                response = self.post({'op': 'add', 'product_id': product_id})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['index'], 0)
+        self.assertEqual(self.cart(), {})
+
+
+class HotQueryPlanTests(QueryPlanTestMixin, TestCase):
+    """The listings read their rows off an index (EXPLAIN QUERY PLAN, see core/perf.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.products, cls.posts = seed_catalog()
+        cls.user = cls.users[0]
+        for product in cls.products[:5]:
+            Wishlist.objects.create(user=cls.user, product=product)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages(self):
+        subcategory = self.products[0].subcategory_id
+        pages = [
+            ('index', [], {}),
+            ('index', [], {'sort': 'price'}),
+            ('index', [], {'min': '10', 'max': '200'}),
+            ('index', [], {'subcategory': subcategory, 'min': '10', 'sort': 'price'}),
+            ('blog', [], {}),
+            ('blog', [], {'tag': 'tag1'}),
+            ('blog_detail', [self.posts[0].slug], {}),
+            ('search', [], {'q': 'Product'}),
+            ('product_detail', [self.products[0].id], {}),
+            ('product_reviews', [self.products[0].id], {}),
+            ('wishlist', [], {}),
+        ]
+        self.client.force_login(self.user)
+        for name, args, params in pages:
+            with self.subTest(name, **params):
+                cache.clear()
+                self.assertNoFullScans(self.client.get(reverse(name, args=args), params))
+
+    def test_product_grid(self):
+        products = Product.objects.order_by('price', 'id')
+        self.assertUsesIndex(products[:13], 'product_price_idx')
+        self.assertUsesIndex(products.filter(price__gte=10)[:13], 'product_price_idx')
+        subcategory = self.products[0].subcategory_id
+        self.assertUsesIndex(products.filter(subcategory=subcategory, price__range=(10, 200))[:13],
+                             'product_subcat_price_idx')
+        self.assertUsesIndex(Product.objects.filter(subcategory=subcategory).order_by('-id')[:13],
+                             'core_product_subcategory_id')
+
+    def test_filtered_rowid_walk_is_a_scan(self):
+        newest = Product.objects.order_by('-id')[:13]
+        sql, params = newest.query.sql_with_params()
+        self.assertEqual(full_scans(sql, query_plan(sql, params)), [])
+        sql, params = Product.objects.filter(name__icontains='x').order_by('-id')[:13].query.sql_with_params()
+        self.assertEqual(full_scans(sql, query_plan(sql, params)), ['core_product'])
+
+    def test_blog_listings(self):
+        self.assertUsesIndex(blog_posts().order_by('-created_at')[:6], 'blogpost_published_idx')
+        published = BlogPost.objects.filter(is_published=True).order_by('-created_at')
+        self.assertUsesIndex(published[:5], 'blogpost_published_idx')
+        self.assertUsesIndex(published.filter(is_featured=True)[:3], 'blogpost_featured_idx')
+
+    def test_wishlist(self):
+        self.assertUsesIndex(Wishlist.objects.filter(user=self.user), 'wishlist_user_added_idx')
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # prices repeat across subcategories, so ('price', 'id') has ties to break
+        _, cls.products, _ = seed_catalog(products_per_subcategory=4)
+
+    def walk(self, ordering):
+        paginator = KeysetPaginator(Product.objects.all(), 5, ordering=ordering)
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(after=pages[-1].next_cursor))
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(paginator.page(before=back[-1].previous_cursor))
+        return [[p.pk for p in page] for page in pages], [[p.pk for p in page] for page in back[::-1]]
+
+    def test_forward_and_back(self):
+        for ordering in (('-id',), ('price', 'id')):
+            with self.subTest(ordering=ordering):
+                forward, back = self.walk(ordering)
+                expected = list(Product.objects.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual(sum(forward, []), expected)
+                self.assertEqual(back, forward)
+
+    def test_bad_cursor_is_the_first_page(self):
+        paginator = KeysetPaginator(Product.objects.all(), 5, ordering=('price', 'id'))
+        first = [p.pk for p in paginator.page()]
+        for cursor in ('not-a-cursor', encode_cursor(['10']), encode_cursor(['x', 'y']), encode_cursor(['1', '2', '3'])):
+            with self.subTest(cursor=cursor):
+                page = paginator.page(after=cursor)
+                self.assertEqual([p.pk for p in page], first)
+                self.assertFalse(page.has_previous)
+                self.assertEqual([p.pk for p in paginator.page(before=cursor)], first)
+
+
+class SearchTests(TestCase):
+    """Ranked matching in core/search.py and the index kept in sync by core/signals.py"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Footwear')
+        cls.subcategory = SubCategory.objects.create(title='Outdoor', category=cls.category)
+
+        def product(name, description='<p>plain</p>'):
+            return Product.objects.create(name=name, category=cls.category, subcategory=cls.subcategory,
+                                          desc='<p>desc</p>', description=description, image='images/product.png',
+                                          mark_price=Decimal(100), discount_percent=Decimal(0))
+        cls.mentioned = product('Rain jacket', '<p>goes with <b>boots</b></p>')
+        cls.boots = product('Leather boots')
+        cls.others = [product(f'Widget {n}') for n in range(5)]
+
+    def setUp(self):
+        if not search.fts_enabled():
+            self.skipTest("Ranked search needs SQLite FTS5")
+
+    def ids(self, query):
+        return [product.pk for product in search.SearchResults(query)[:20]]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.ids('boots'), [self.boots.pk, self.mentioned.pk])
+        self.assertEqual(self.ids('boo'), [self.boots.pk, self.mentioned.pk])  # the last word is a prefix
+        self.assertEqual(self.ids('leather boo'), [self.boots.pk])
+        self.assertEqual(self.ids('footwear widget 3'), [self.others[3].pk])
+        self.assertEqual(self.ids('sandals'), [])
+
+    def test_paginator(self):
+        results = search.SearchResults('widget')
+        paginator = Paginator(results, 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertEqual(paginator.num_pages, 3)
+        pages = [[product.pk for product in paginator.page(n)] for n in paginator.page_range]
+        self.assertEqual(sorted(sum(pages, [])), sorted(product.pk for product in self.others))
+        self.assertEqual(results[1].pk, pages[0][1])
+
+    def test_index_follows_changes(self):
+        self.boots.name = 'Leather sandals'
+        self.boots.save()
+        self.assertEqual(self.ids('sandals'), [self.boots.pk])
+        self.assertEqual(self.ids('boots'), [self.mentioned.pk])
+
+        self.category.title = 'Shoes'
+        self.category.save()
+        self.assertEqual(len(self.ids('shoes')), 7)
+        self.assertEqual(self.ids('footwear'), [])
+
+        self.mentioned.delete()
+        self.assertEqual(self.ids('jacket'), [])
+
+    def test_awkward_queries(self):
+        for query in ['"', '"boots', 'boots*', '*', 'boots NEAR leather', 'NEAR(boots leather)', 'boots OR',
+                      'OR', 'AND NOT', '-boots', '^boots', 'name:boots', "'", '(', '', '   ']:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(reverse('search'), {'q': query}).status_code, 200)
+        self.assertEqual(self.ids('boots NEAR'), [])
+        self.assertEqual(self.ids('"leather" boots*'), [self.boots.pk])
+
+
+class ConditionalGetTests(TestCase):
+    """product_detail and blog_detail answer a matching If-None-Match with a 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.products, cls.posts = seed_catalog(products_per_subcategory=2)
+        cls.product = cls.products[0]
+        cls.user = cls.users[0]
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_product_not_modified(self):
+        url = reverse('product_detail', args=[self.product.id])
+        first, second = self.revalidate(url)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertLessEqual(second.perf.queries, 1)
+        self.assertIn('Cookie', second['Vary'])
+
+        Review.objects.create(product=self.product, user=self.users[5], rating=5, feedback='new')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_anonymous_last_modified(self):
+        url = reverse('blog_detail', args=[self.posts[0].slug])
+        first, second = self.revalidate(url)
+        self.assertEqual(second.status_code, 304)
+        self.assertIn('Last-Modified', first)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        self.assertIn('public', self.client.get(url)['Cache-Control'])
+
+        BlogComment.objects.create(post=self.posts[0], author=self.user, content='late')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_logged_in_is_private_and_per_visitor(self):
+        self.client.force_login(self.user)
+        url = reverse('product_detail', args=[self.product.id])
+        first, second = self.revalidate(url)
+        self.assertEqual(second.status_code, 304)
+        self.assertNotIn('Last-Modified', first)
+        self.assertIn('private', first['Cache-Control'])
+
+        # the heart on the page flips, so must the ETag
+        self.client.post(reverse('toggle_wishlist', args=[self.product.id]))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_category_tree_change(self):
+        url = reverse('product_detail', args=[self.product.id])
+        first, _ = self.revalidate(url)
+        bump_version(CATEGORY_TREE)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_pending_messages_are_shown(self):
+        Review.objects.create(product=self.product, user=self.user, rating=4, feedback='mine')
+        self.client.force_login(self.user)
+        url = reverse('product_detail', args=[self.product.id])
+        first, _ = self.revalidate(url)
+        # a second review is refused with a flash message and nothing else changes
+        self.client.post(url, {'rating': 5, 'feedback': 'again'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class PageCacheTests(TestCase):
+    """Anonymous pages come from core/page_cache.py until content changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users, cls.products, cls.posts = seed_catalog(products_per_subcategory=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hit_without_queries(self):
+        url = reverse('product_detail', args=[self.products[0].id])
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertEqual(response.perf.queries, 0)
+
+    def test_querystring_is_normalized(self):
+        self.client.get(reverse('index'), {'sort': 'price', 'min': '10'})
+        response = self.client.get(reverse('index') + '?min=10&utm_source=mail&sort=price&max=')
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    def test_each_visitor_gets_their_own_csrf_token(self):
+        url = reverse('product_detail', args=[self.products[0].id])
+        self.client.get(url)
+        other = self.client_class()
+        response = other.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertNotIn(page_cache.CSRF_PLACEHOLDER, response.content)
+        token = page_cache.CSRF_INPUT.search(response.content).group(1).decode()
+        self.assertEqual(_unmask_cipher_token(token), other.cookies['csrftoken'].value)
+
+    def test_every_csrf_token_is_replaced(self):
+        forms = '<input name="csrfmiddlewaretoken" value="{}"><input name="csrfmiddlewaretoken" value="{}">'
+        view = page_cache.cached_page(lambda request: HttpResponse(forms.format(get_token(request), get_token(request))))
+        view(RequestFactory().get('/two-forms/'))
+        request = RequestFactory().get('/two-forms/')
+        response = view(request)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        tokens = page_cache.CSRF_INPUT.findall(response.content)
+        self.assertEqual([_unmask_cipher_token(token.decode()) for token in tokens], [request.META['CSRF_COOKIE']] * 2)
+
+    @override_settings(PAGE_CACHE_TIMEOUT=300, CACHE_IS_SHARED=False)
+    def test_deploy_check_wants_a_shared_cache(self):
+        self.assertEqual([warning.id for warning in checks.check_page_cache(None)], ['core.W001'])
+        with self.settings(CACHE_IS_SHARED=True):
+            self.assertEqual(checks.check_page_cache(None), [])
+
+    def test_logged_in_bypass(self):
+        self.client.force_login(self.users[0])
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('product_detail', args=[self.products[0].id])))
+
+    def test_content_change_single_flight(self):
+        url = reverse('index')
+        self.client.get(url)
+        self.products[0].save()
+
+        # while another request holds the lock and re-renders, the stale copy is served
+        lock = page_cache.page_key(RequestFactory().get(url)) + ':lock'
+        cache.add(lock, 1)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'STALE')
+        cache.delete(lock)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+
+
+class StaticFilesTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        os.makedirs(os.path.join(root.name, 'css'))
+        for name in ('css/base.css', 'css/base.0123456789ab.css'):
+            with open(os.path.join(root.name, name), 'w') as f:
+                f.write('body { margin: 0; }\n' * 200)
+            staticfiles.compress(os.path.join(root.name, name))
+        settings = override_settings(STATIC_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.middleware = staticfiles.StaticFilesMiddleware(lambda request: HttpResponse('view'))
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, **headers))
+
+    def test_hashed_name_gzip(self):
+        response = self.get('/static/css/base.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, deflate, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'], staticfiles.IMMUTABLE)
+        self.assertEqual(int(response['Content-Length']), len(b''.join(response.streaming_content)))
+        self.assertNotIn('Content-Disposition', response)
+
+        response = self.get('/static/css/base.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip',
+                            HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unhashed_name_identity(self):
+        response = self.get('/static/css/base.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], staticfiles.REVALIDATE)
+
+    def test_unknown_falls_through(self):
+        self.assertEqual(self.get('/static/css/missing.css').content, b'view')
+
+    async def test_async(self):
+        async def view(request):
+            return HttpResponse('view')
+        middleware = staticfiles.StaticFilesMiddleware(view)
+        response = await middleware(RequestFactory().get('/static/css/base.css'))
+        self.assertEqual(response['Cache-Control'], staticfiles.REVALIDATE)
+        self.assertEqual((await middleware(RequestFactory().get('/about/'))).content, b'view')
+
+
+class CssBundleTests(TestCase):
+
+    def read(self, name):
+        with open(finders.find(name), encoding='utf-8') as f:
+            return f.read()
+
+    def test_build(self):
+        bundle, critical = css_bundle.build(self.read)
+        self.assertTrue(bundle.startswith('@import '))
+        self.assertNotIn('/*', bundle)
+        self.assertNotIn('@charset', bundle)
+        self.assertIn('.pp_default', bundle)
+
+        self.assertIn('.slider-title{', critical)
+        self.assertIn('.custom-navbar{', critical)
+        self.assertNotIn('.pp_default', critical)
+        self.assertNotIn(':hover', critical)
+        self.assertLess(len(critical), len(bundle) / 5)
+
+    def test_minify_keeps_strings_and_media(self):
+        css = '/* x */ a :first-child , b > i { content: "{ ; }" ; width: calc(1px + 2px); }\n' \
+              '@media screen and (max-width: 10px) { .navbar { color: red; } .other { color: blue } }'
+        minified = css_bundle.minify(css)
+        self.assertEqual(minified, 'a :first-child,b>i{content:"{ ; }";width:calc(1px + 2px)}'
+                                   '@media screen and (max-width:10px){.navbar{color:red}.other{color:blue}}')
+        self.assertEqual(css_bundle.serialize(css_bundle.critical(css_bundle.parse(minified))),
+                         'a :first-child,b>i{content:"{ ; }";width:calc(1px + 2px)}'
+                         '@media screen and (max-width:10px){.navbar{color:red}}')
+
+    def test_links_sources_without_a_bundle(self):
+        html = Template('{% load css_tags %}{% site_stylesheets %}').render(Context())
+        self.assertNotIn('<style>', html)
+        for name in css_bundle.SOURCES:
+            self.assertIn(f'<link href="{static(name)}" rel="stylesheet">', html)
+
+
+class MediaServingTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        os.makedirs(os.path.join(root.name, 'images'))
+        self.data = bytes(range(256)) * 40
+        with open(os.path.join(root.name, 'images', 'shoe.jpg'), 'wb') as f:
+            f.write(self.data)
+        settings = override_settings(MEDIA_ROOT=root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.url = '/media/images/shoe.jpg'
+
+    def test_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age=86400', response['Cache-Control'])
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+        # a partial copy of another version gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_byte_range(self):
+        self.assertEqual(media.byte_range('bytes=0-', 10), (0, 9))
+        self.assertEqual(media.byte_range('bytes=5-100', 10), (5, 9))
+        self.assertEqual(media.byte_range('bytes=-100', 10), (0, 9))
+        self.assertIsNone(media.byte_range('bytes=0-1,5-6', 10))
+        self.assertIsNone(media.byte_range('bytes=5-1', 10))
+        with self.assertRaises(ValueError):
+            media.byte_range('bytes=-0', 10)
+
+    @override_settings(MEDIA_OFFLOAD='x-accel')
+    def test_offload(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/images/shoe.jpg')
+        self.assertEqual(response.content, b'')
+
+    def test_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/images/').status_code, 404)
+
+
+class ProductStatsTests(TestCase):
+
+    def test_save_keeps_review_stats(self):
+        _, products, _ = seed_catalog(products_per_subcategory=1)
+        product = products[-1]
+        stale = Product.objects.get(pk=product.pk)
+        Review.objects.create(product=product, user=make_user('late'), rating=4, feedback='ok')
+
+        stale.mark_price = Decimal(500)
+        stale.save()
+        product.refresh_from_db()
+        self.assertEqual((product.review_count, product.rating_sum, product.rating_4), (1, 4, 1))
+        self.assertEqual(product.price, Decimal(450))
+
+
+class BufferedCounterTests(TestCase):
+
+    def test_failed_flush_is_logged_and_kept(self):
+        # a field the UPDATE can't set stands in for a locked database
+        counter = BufferedCounter(BlogPost, 'no_such_field', flush_interval=0, flush_threshold=1)
+        with self.assertLogs('core.counters', 'WARNING'):
+            counter.hit(7)
+        self.assertEqual(counter.pending(7), 1)
+
+    def test_no_flusher_or_exit_hook_under_the_test_runner(self):
+        counter = BufferedCounter(BlogPost, 'views', flush_interval=60, flush_threshold=100)
+        with mock.patch('core.counters.atexit.register') as register:
+            counter.hit(7)
+        register.assert_not_called()
+        self.assertIsNone(counter._timer)
+        self.assertEqual(counter.pending(7), 1)
+
+
+class SyntheticDataTests(TestCase):
+    """core/synthetic.py: same seed, same rows, and the rows save() would have written"""
+
+    SIZES = {'users': 5, 'categories': 2, 'subcategories': 2, 'products': 12, 'images': 1, 'offers': 2,
+             'reviews': 20, 'wishlists': 10, 'blog_categories': 2, 'tags': 3, 'posts': 4, 'comments': 6,
+             'orders': 6, 'items': 2}
+
+    def generate(self, prefix, seed=7):
+        # the rows of this run are the ones after the current last id of each table
+        after = {model: model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+                 for model in (Product, Review, BlogPost, Order, Transaction)}
+        DataGenerator(self.SIZES, seed=seed, prefix=prefix, batch_size=4, write_images=False,
+                      log=lambda message: None).run()
+
+        def rows(model, *fields):
+            found = model.objects.filter(pk__gt=after[model]).order_by('pk').values_list(*fields)
+            return [tuple(str(value).replace(prefix, 'run').replace(prefix.capitalize(), 'Run') for value in row)
+                    for row in found]
+        return {
+            'products': rows(Product, 'name', 'category__title', 'subcategory__title', 'mark_price',
+                             'discount_percent', 'price', 'description'),
+            'reviews': rows(Review, 'product__name', 'user__username', 'rating', 'feedback'),
+            'posts': rows(BlogPost, 'title', 'slug', 'author__username', 'category__name', 'excerpt'),
+            'orders': rows(Order, 'user__username', 'phone', 'total', 'is_pay'),
+            'payments': rows(Transaction, 'user', 'total', 'order__total'),
+        }
+
+    def test_same_seed_same_rows(self):
+        first = self.generate('runa')
+        self.assertTrue(all(first.values()))
+        self.assertEqual(self.generate('runb'), first)
+        self.assertNotEqual(self.generate('runc', seed=8)['products'], first['products'])
+
+    def test_rows_match_save_and_slugify(self):
+        self.generate('runa')
+        for product in Product.objects.all():
+            price = product.price
+            product.save()
+            product.refresh_from_db()
+            self.assertEqual(product.price, price)
+        for model, field in ((BlogPost, 'title'), (BlogCategory, 'name'), (Tag, 'name')):
+            for title, slug in model.objects.values_list(field, 'slug'):
+                self.assertEqual(slugify(title), slug)
@@ -0,0 +1,141 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+from PIL.ExifTags import Base
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+'''
+Responsive image derivatives
+
+Every catalog upload gets resized copies at THUMBNAIL_WIDTHS in WebP and
+JPEG, stored next to the media as thumbs/<name>-<width>w.<ext>. They are made
+in a small thread pool after the saving transaction commits (Pillow releases
+the GIL while resizing), so the admin never waits on them, and
+`python manage.py build_thumbnails` backfills existing media.
+{% responsive_image %} (core/templatetags/image_tags.py) only offers widths
+that exist, falling back to the original file.
+'''
+
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+
+# which widths exist per image, re-checked against storage after this long
+AVAILABLE_TIMEOUT = 60 * 60 * 24
+
+
+def derivative_name(name, width, ext):
+    root, _ = os.path.splitext(name)
+    return f'thumbs/{root}-{width}w.{ext}'
+
+
+def _available_key(name):
+    return f'thumbs:{name}'
+
+
+def available_widths(name):
+    """Widths that have every format generated for `name`, smallest first"""
+    key = _available_key(name)
+    widths = cache.get(key)
+    if widths is None:
+        widths = [
+            width for width in settings.THUMBNAIL_WIDTHS
+            if all(default_storage.exists(derivative_name(name, width, ext)) for ext, _, _ in FORMATS)
+        ]
+        cache.set(key, widths, AVAILABLE_TIMEOUT)
+    return widths
+
+
+ORIENTATION = Base.Orientation
+# EXIF orientations that turn the image on its side, exif_transpose swaps width and height for them
+SIDEWAYS = {5, 6, 7, 8}
+
+
+def _display_width(f):
+    """Width of the image in `f` once EXIF-rotated, from its header alone"""
+    image = Image.open(f)
+    return image.height if image.getexif().get(ORIENTATION) in SIDEWAYS else image.width
+
+
+def generate(name, force=False):
+    """Write the missing derivatives of `name`, returns how many files were written"""
+    with default_storage.open(name, 'rb') as f:
+        if not force:
+            # re-saved products mostly keep their image, only decode it when something is missing
+            width = _display_width(f)
+            widths = [w for w in settings.THUMBNAIL_WIDTHS if w < width]
+            if all(default_storage.exists(derivative_name(name, w, ext)) for w in widths for ext, _, _ in FORMATS):
+                cache.set(_available_key(name), widths, AVAILABLE_TIMEOUT)
+                return 0
+            f.seek(0)
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.load()
+
+    written = 0
+    widths = []
+    for width in settings.THUMBNAIL_WIDTHS:
+        # never upscale, the original serves anything wider
+        if width >= image.width:
+            break
+        widths.append(width)
+        resized = None
+        for ext, pil_format, _ in FORMATS:
+            target = derivative_name(name, width, ext)
+            if not force and default_storage.exists(target):
+                continue
+            if resized is None:
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+            out = resized
+            if pil_format == 'JPEG' and out.mode not in ('RGB', 'L'):
+                # flatten transparency onto white, JPEG has no alpha
+                background = Image.new('RGB', out.size, 'white')
+                background.paste(out, mask=out.convert('RGBA').getchannel('A'))
+                out = background
+            buffer = io.BytesIO()
+            out.save(buffer, pil_format, quality=settings.THUMBNAIL_QUALITY, optimize=True)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+            written += 1
+
+    cache.set(_available_key(name), widths, AVAILABLE_TIMEOUT)
+    return written
+
+
+def _generate_logged(name):
+    try:
+        return generate(name)
+    except Exception:
+        logger.exception("Could not build thumbnails for %s", name)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    return _pool
+
+
+def schedule(name):
+    """Build derivatives for `name` in the background once the current transaction commits"""
+    if name:
+        transaction.on_commit(lambda: get_pool().submit(_generate_logged, name))
@@ -9,12 +9,14 @@ urlpatterns = [
     path("contact/", contact, name="contact"),
     path("search/",search,name="search"),
     path("product_detail/<int:id>",product_detail,name="product_detail"),
+    path("product_detail/<int:id>/reviews/",product_reviews,name="product_reviews"),
     path('cart/add/<int:id>/',cart_add, name='cart_add'),
     path('cart/item_clear/<int:id>/',item_clear, name='item_clear'),
     path('cart/item_increment/<int:id>/',item_increment, name='item_increment'),
     path('cart/item_decrement/<int:id>/',item_decrement, name='item_decrement'),
     path('cart/cart_clear/',cart_clear, name='cart_clear'),
     path('cart/cart-detail/',cart_detail, name='cart_detail'),
+    path('cart/api/',cart_api, name='cart_api'),
 
         # Wishlist URLs
     path('wishlist/', wishlist, name='wishlist'),
@@ -23,3 +25,28 @@ urlpatterns = [
     path('wishlist/toggle/<int:product_id>/', toggle_wishlist, name='toggle_wishlist'),
 
 ]
+
+
+# most SQL queries a request may run (cold cache, session and auth included),
+# enforced on seeded data by core/tests.py, see core/perf.py
+QUERY_BUDGETS = {
+    'index': 19,
+    'blog': 9,
+    'blog_detail': 5,
+    'about_us': 1,
+    'contact': 1,
+    'search': 6,
+    'product_detail': 10,
+    'product_reviews': 4,
+    'cart_add': 10,
+    'item_clear': 6,
+    'item_increment': 8,
+    'item_decrement': 6,
+    'cart_clear': 6,
+    'cart_detail': 8,
+    'cart_api': 8,
+    'wishlist': 8,
+    'add_to_wishlist': 8,
+    'remove_from_wishlist': 5,
+    'toggle_wishlist': 7,
+}
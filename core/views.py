@@ -1,26 +1,40 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import OfferProduct,Category,Product,SubCategory, BlogPost, BlogCategory, Tag, BlogComment , Wishlist
-from django.db.models import Count, Prefetch, Avg
+from django.db.models import Q, Prefetch
 from django.core.paginator import Paginator
 from .forms import ReviewForm
 from django.contrib.auth.decorators import login_required
-from cart.cart import Cart
+from .shopping_cart import SessionCart, CartOperationError, parse_operations
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse
+import json
+from django.http import JsonResponse, Http404
+from django.views.decorators.http import require_POST
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from .pagination import KeysetPaginator
+from .search import SearchResults
+from .counters import blog_post_views
+from .wishlists import wishlist_ids
+from . import conditional, product_cache
+from .page_cache import cached_page
+from .catalog_cache import category_tree_version, get_category_tree, get_blog_sidebar, blog_posts
+from django.template.loader import render_to_string
+
+REVIEWS_PER_PAGE = 10
 
 # Create your views here.
 
+@cached_page
 def index(request):
     # Get offers and categories with related products
-    offer = OfferProduct.objects.filter(is_active=True).select_related('product')
-    category = Category.objects.annotate(
-        subcategory_count=Count('subcategory')
-    ).prefetch_related(
-        Prefetch(
-            'subcategory_set',
-            queryset=SubCategory.objects.annotate(product_count=Count('product'))
-        )
+    offer = list(OfferProduct.objects.filter(is_active=True))
+    offer_products = product_cache.get_many(i.product_id for i in offer if i.product_id)
+    for i in offer:
+        if i.product_id:
+            i.product = offer_products.get(i.product_id)
+    # category tabs show 8 products each, fetched for all tabs in one windowed query
+    category = Category.objects.prefetch_related(
+        Prefetch('product_set', queryset=Product.objects.order_by('id')[:8], to_attr='tab_products')
     )
     
     # Get recommended products (latest 12 products for the carousel)
@@ -57,18 +71,30 @@ def index(request):
         except ValueError:
             pass
 
-    # Pagination - changed from 2 to 9 products per page (you can adjust this)
-    paginator = Paginator(product, 9)
-    page_n = request.GET.get('page')
-    data = paginator.get_page(page_n)
-    total = data.paginator.num_pages
+    # Keyset pagination - page N costs the same as page 1 (no COUNT/OFFSET)
+    # ?sort=price walks the grid cheapest first, otherwise newest first
+    sort = request.GET.get('sort')
+    ordering = ('price', 'id') if sort == 'price' else ('-id',)
+    paginator = KeysetPaginator(
+        product,
+        settings.PRODUCT_GRID_PAGE_SIZE,
+        ordering=ordering,
+        with_total=settings.PRODUCT_GRID_APPROX_TOTAL,
+    )
+    data = paginator.page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
 
     context = {
         'offer': offer,
         'category': category,
+        # sidebar accordion is a cached fragment keyed on this version,
+        # the tree itself is only built (lazily, from the template) on a miss
+        'category_tree_version': category_tree_version(),
+        'category_tree': get_category_tree,
         'product': data,  # Changed to use paginated data
         'data': data,
-        'num': [i+1 for i in range(total)],
         'recommended_products': recommended_products,  # Added for carousel
     }
 
@@ -76,9 +102,11 @@ def index(request):
 
 
 
+@cached_page
 def blog(request):
     # Get all blog posts ordered by creation date
-    posts_list = BlogPost.objects.filter(is_published=True).order_by('-created_at')
+    # author/category joined, tags prefetched and comments counted in the same query
+    posts_list = blog_posts().order_by('-created_at')
     
     # Filter by category if provided
     category_id = request.GET.get('category')
@@ -94,9 +122,7 @@ def blog(request):
     search_query = request.GET.get('search')
     if search_query:
         posts_list = posts_list.filter(
-            title__icontains=search_query
-        ) | posts_list.filter(
-            content__icontains=search_query
+            Q(title__icontains=search_query) | Q(content__icontains=search_query)
         )
     
     # Pagination
@@ -104,49 +130,40 @@ def blog(request):
     page_number = request.GET.get('page')
     posts = paginator.get_page(page_number)
     
-    # Get blog categories with post count
-    blog_categories = BlogCategory.objects.annotate(
-        post_count=Count('blogpost')
-    )
-    
-    # Get recent posts (last 5)
-    recent_posts = BlogPost.objects.filter(
-        is_published=True
-    ).order_by('-created_at')[:5]
-    
-    # Get featured posts (last 3)
-    featured_posts = BlogPost.objects.filter(
-        is_published=True,
-        is_featured=True
-    ).order_by('-created_at')[:3]
-    
-    # Get popular tags
-    popular_tags = Tag.objects.annotate(
-        post_count=Count('blogpost')
-    ).order_by('-post_count')[:10]
-    
+    # categories, popular tags, recent and featured posts come from one cached bundle
     context = {
         'posts': posts,
-        'blog_categories': blog_categories,
-        'recent_posts': recent_posts,
-        'featured_posts': featured_posts,
-        'popular_tags': popular_tags,
+        **get_blog_sidebar(),
     }
     
     return render(request, 'core/blog.html', context)
 
 
 
+def _blog_post_validators(request, slug):
+    # the two columns off the slug index, the full post query only runs on a miss
+    found = BlogPost.objects.filter(slug=slug, is_published=True).values_list('pk', 'updated_at').first()
+    if found is None:
+        return None
+    pk, updated_at = found
+    return max(updated_at.timestamp(), conditional.stamp('blogpost', pk)), []
+
+
+# a 304 is a revalidation rather than a new read, so it is not counted in views
+@conditional.conditional_page(_blog_post_validators)
 def blog_detail(request, slug):
-    post = get_object_or_404(BlogPost, slug=slug, is_published=True)
-    post.views += 1
-    post.save(update_fields=['views'])
+    post = get_object_or_404(blog_posts(), slug=slug)
+    # counted in memory and written in batches, see core/counters.py
+    pending = blog_post_views.pending(post.pk)
+    blog_post_views.hit(post.pk)
+    post.views += pending + 1
     
     context = {
         'post': post,
     }
     return render(request, 'core/blog_detail.html', context)
 
+@cached_page
 def about_us(request):
     return render(request,'core/about_us.html')
 
@@ -156,27 +173,30 @@ def contact(request):
         messages.success(request, 'Thank you! We\'ll reply within 1 hour.')
     return render(request, 'core/contact.html')
 
+def _product_validators(request, id):
+    try:
+        product = product_cache.get(id)
+    except Product.DoesNotExist:
+        return None
+    last_modified = max(product.created_date.timestamp(), conditional.stamp('product', product.pk))
+    # the wishlist heart
+    return last_modified, [product.pk in wishlist_ids(request.user)]
+
+
+@conditional.conditional_page(_product_validators)
+@cached_page
 def product_detail(request, id):
     """
     Display product details with dynamic reviews and ratings.
     Handle review submission with authentication and duplicate checks.
     """
-    product = get_object_or_404(Product, id=id)
+    # cached with its gallery (core/product_cache.py), the template loops over it twice
+    product = product_cache.get_or_404(id)
     all_reviews = product.reviews.all()
 
-    # --- 1. Dynamic Review Calculation ---
-    review_stats = all_reviews.aggregate(
-        average_rating=Avg('rating'), 
-        review_count=Count('id')
-    )
-    
-    # Extract calculated values with proper defaults
-    average_rating = review_stats.get('average_rating') or 0
-    review_count = review_stats.get('review_count', 0)
-    
-    # Round average rating for cleaner display (e.g., 4.5 instead of 4.523)
-    if average_rating:
-        average_rating = round(average_rating, 1)
+    # --- 1. Review Stats (kept on the product row, see core/ratings.py) ---
+    average_rating = product.average_rating
+    review_count = product.review_count
     
     # Calculate star distribution for visual display
     full_stars = int(average_rating)
@@ -213,16 +233,20 @@ def product_detail(request, id):
             # Handle form validation errors
             messages.error(request, "Please correct the errors in your review.")
     # ---------------------------------------------
+
+    # Only the newest page of reviews, the rest comes from product_reviews
+    reviews = _review_page(product)
             
     context = {
         "product": product,
         'form': form,
-        'reviews': all_reviews,
+        'reviews': reviews,
         'range': range(1, 6),
         
         # --- Review Statistics ---
         'review_count': review_count,
         'average_rating': average_rating,
+        'rating_histogram': product.rating_histogram(),
         
         # --- Star Display Helper ---
         'full_stars': range(full_stars),
@@ -233,23 +257,46 @@ def product_detail(request, id):
 
     return render(request, 'core/product_detail.html', context)
 
+
+def _review_page(product, after=None):
+    reviews = product.reviews.select_related('user').only(
+        'id', 'rating', 'feedback', 'created_date', 'product_id', 'user__username'
+    )
+    paginator = KeysetPaginator(reviews, REVIEWS_PER_PAGE, ordering=('-id',))
+    return paginator.page(after=after)
+
+
+def product_reviews(request, id):
+    """
+    Next page of reviews for "Load more" on the product page.
+    Returns the rendered cards plus the cursor for the page after.
+    """
+    product = product_cache.get_or_404(id)
+    reviews = _review_page(product, after=request.GET.get('after'))
+
+    html = render_to_string('core/partials/review_list.html', {
+        'reviews': reviews,
+        'range': range(1, 6),
+    }, request=request)
+
+    return JsonResponse({
+        'html': html,
+        'has_next': reviews.has_next,
+        'next_cursor': reviews.next_cursor,
+    })
+
 # search funcitonality
 def search(request):
     query = request.GET.get('q', '').strip()
-    products = Product.objects.none()  # empty by default
-    
-    if query:
-        products = Product.objects.filter(
-            Q(name__icontains=query) | 
-            Q(desc__icontains=query) |
-            Q(category__title__icontains=query) |
-            Q(subcategory__title__icontains=query)
-        ).distinct()
+
+    # ranked full-text results (see core/search.py), only the current page is loaded
+    paginator = Paginator(SearchResults(query), 12)
+    products = paginator.get_page(request.GET.get('page'))
 
     context = {
         'query': query,
         'products': products,
-        'count': products.count(),
+        'count': paginator.count,
     }
     return render(request, 'core/search.html', context)
 
@@ -258,46 +305,80 @@ def search(request):
 '''  Cart Details  '''
 @login_required(login_url="log_in")
 def cart_add(request, id):
-    cart = Cart(request)
-    product = Product.objects.get(id=id)
+    cart = SessionCart(request)
+    product = product_cache.get_or_404(id)
     cart.add(product=product)
     return redirect("index")
 
 
 @login_required(login_url="log_in")
 def item_clear(request, id):
-    cart = Cart(request)
-    product = Product.objects.get(id=id)
+    cart = SessionCart(request)
+    product = product_cache.get_or_404(id)
     cart.remove(product)
     return redirect("cart_detail")
 
 
 @login_required(login_url="log_in")
 def item_increment(request, id):
-    cart = Cart(request)
-    product = Product.objects.get(id=id)
+    cart = SessionCart(request)
+    product = product_cache.get_or_404(id)
     cart.add(product=product)
     return redirect("cart_detail")
 
 
 @login_required(login_url="log_in")
 def item_decrement(request, id):
-    cart = Cart(request)
-    product = Product.objects.get(id=id)
+    cart = SessionCart(request)
+    product = product_cache.get_or_404(id)
     cart.decrement(product=product)
     return redirect("cart_detail")
 
 
 @login_required(login_url="log_in")
 def cart_clear(request):
-    cart = Cart(request)
+    cart = SessionCart(request)
     cart.clear()
     return redirect("cart_detail")
 
 
+@login_required(login_url="log_in")
+@require_POST
+def cart_api(request):
+    """
+    Batch of cart changes in one request, eg
+    {"operations": [{"op": "add", "product_id": 5, "qty": 2}, {"op": "remove", "product_id": 7}]}
+    Referenced products come from the product cache (one query for the misses), the batch applies all or nothing.
+    """
+    try:
+        operations = parse_operations(json.loads(request.body or b'null'))
+        products = product_cache.get_many(product_id for op, product_id, qty in operations if product_id is not None)
+        cart = SessionCart(request)
+        touched = cart.apply(operations, products)
+    except CartOperationError as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'index': e.index}, status=400)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+
+    lines = {}
+    for product_id in touched:
+        quantity = cart.quantity(product_id)
+        product = products.get(product_id)
+        lines[product_id] = {
+            'quantity': quantity,
+            'total': str(product.price * quantity) if product and quantity else '0',
+        }
+    return JsonResponse({
+        'status': 'success',
+        'lines': lines,
+        'summary': cart.summary,
+    })
+
+
 @login_required(login_url="log_in")
 def cart_detail(request):
-    return render(request, 'core/cart.html')
+    cart = SessionCart(request)
+    return render(request, 'core/cart.html', {'cart_lines': cart.lines()})
 
 # wishlist section
 @login_required
@@ -312,16 +393,29 @@ def wishlist(request):
     return render(request, 'core/wishlist.html', context)
 
 
+def _wishlist_insert(user, product_id):
+    """Add the row, False if it was already there. Unknown products raise Http404"""
+    # the product FK is checked when the transaction commits, so inside an
+    # outer transaction (ATOMIC_REQUESTS, tests) it has to be looked up first
+    if transaction.get_connection().in_atomic_block and not product_cache.get_many([product_id]):
+        raise Http404("No Product matches the given query.")
+    try:
+        with transaction.atomic():
+            Wishlist.objects.create(user=user, product_id=product_id)
+    except IntegrityError:
+        # either the unique (user, product) pair or the product FK
+        if not product_cache.get_many([product_id]):
+            raise Http404("No Product matches the given query.")
+        return False
+    return True
+
+
 @login_required
 def add_to_wishlist(request, product_id):
     """Add product to wishlist"""
-    product = get_object_or_404(Product, id=product_id)
-    
-    # Check if already in wishlist
-    wishlist_item, created = Wishlist.objects.get_or_create(
-        user=request.user,
-        product=product
-    )
+    # cached, so the name costs no query and _wishlist_insert finds it there too
+    product = product_cache.get_or_404(product_id)
+    created = _wishlist_insert(request.user, product.id)
     
     if created:
         messages.success(request, f"{product.name} added to your wishlist!")
@@ -342,13 +436,12 @@ def add_to_wishlist(request, product_id):
 @login_required
 def remove_from_wishlist(request, product_id):
     """Remove product from wishlist"""
-    product = get_object_or_404(Product, id=product_id)
+    product = product_cache.get_or_404(product_id)
+    deleted, _ = Wishlist.objects.filter(user=request.user, product_id=product.id).delete()
     
-    try:
-        wishlist_item = Wishlist.objects.get(user=request.user, product=product)
-        wishlist_item.delete()
+    if deleted:
         messages.success(request, f"{product.name} removed from your wishlist.")
-    except Wishlist.DoesNotExist:
+    else:
         messages.error(request, "Product not found in your wishlist.")
     
     # Return JSON for AJAX requests
@@ -364,17 +457,13 @@ def remove_from_wishlist(request, product_id):
 @login_required
 def toggle_wishlist(request, product_id):
     """Toggle product in/out of wishlist (for heart icon)"""
-    product = get_object_or_404(Product, id=product_id)
-    
-    try:
-        wishlist_item = Wishlist.objects.get(user=request.user, product=product)
-        wishlist_item.delete()
-        in_wishlist = False
-        message = "Removed from wishlist"
-    except Wishlist.DoesNotExist:
-        Wishlist.objects.create(user=request.user, product=product)
-        in_wishlist = True
-        message = "Added to wishlist"
+    product = product_cache.get_or_404(product_id)
+    # delete first, only insert when there was nothing to delete
+    deleted, _ = Wishlist.objects.filter(user=request.user, product_id=product.id).delete()
+    in_wishlist = not deleted
+    if in_wishlist:
+        _wishlist_insert(request.user, product.id)
+    message = "Added to wishlist" if in_wishlist else "Removed from wishlist"
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
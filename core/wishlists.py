@@ -0,0 +1,35 @@
+from django.core.cache import cache
+
+from .models import Wishlist
+
+
+'''
+Wishlist membership
+
+Each user's wishlisted product ids are cached as one frozenset so a product
+grid can mark its hearts with a set lookup per card. core/signals.py drops the
+entry whenever a Wishlist row is saved or deleted, the next read rebuilds it
+with a single values_list query.
+'''
+
+WISHLIST_IDS_TIMEOUT = 60 * 60 * 24
+
+
+def _key(user_id):
+    return f'wishlist_ids:{user_id}'
+
+
+def wishlist_ids(user):
+    """Product ids in `user`'s wishlist, empty for anonymous users"""
+    if not user.is_authenticated:
+        return frozenset()
+    key = _key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(Wishlist.objects.filter(user_id=user.pk).order_by().values_list('product_id', flat=True))
+        cache.set(key, ids, WISHLIST_IDS_TIMEOUT)
+    return ids
+
+
+def forget(user_id):
+    cache.delete(_key(user_id))
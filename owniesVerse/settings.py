@@ -26,6 +26,18 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = config('DJANGO_SECRET_KEY')
 KHALTI_SECRET_KEY = config('KHALTI_SECRET_KEY')
 
+# Khalti ePayment gateway (payments/khalti.py)
+KHALTI_BASE_URL = config('KHALTI_BASE_URL', default='https://dev.khalti.com/api/v2/')
+KHALTI_CONNECT_TIMEOUT = config('KHALTI_CONNECT_TIMEOUT', default=3.05, cast=float)
+KHALTI_READ_TIMEOUT = config('KHALTI_READ_TIMEOUT', default=10, cast=float)
+KHALTI_RETRIES = 2
+KHALTI_RETRY_BACKOFF = 0.25  # seconds, doubled on every retry
+KHALTI_BREAKER_THRESHOLD = 5  # failures in a row before we stop calling Khalti
+KHALTI_BREAKER_RESET = 30  # seconds before trying again
+KHALTI_POOL_SIZE = 10
+# serve initkhalti/verify from payments/async_views.py, run under owniesVerse/asgi.py
+KHALTI_ASYNC_VIEWS = config('KHALTI_ASYNC_VIEWS', default=False, cast=bool)
+
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -49,13 +61,13 @@ EXTERNAL_APPS = [
     'core',
     'accounts',
     'django_ckeditor_5',
-    'cart',
     'payments',
 ]
 
 INSTALLED_APPS.extend(EXTERNAL_APPS)
 
 MIDDLEWARE = [
+    'core.staticfiles.StaticFilesMiddleware',  # collected static files never reach the rest
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,11 +77,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# query count, SQL/template/total time per request (core/perf.py), budgets are QUERY_BUDGETS
+# in core/urls.py and accounts/urls.py; over budget requests are logged and fail the tests
+PERF_BUDGETS = config('PERF_BUDGETS', default=DEBUG, cast=bool)
+PERF_SERVER_TIMING = config('PERF_SERVER_TIMING', default=DEBUG, cast=bool)  # Server-Timing header
+if PERF_BUDGETS or PERF_SERVER_TIMING:
+    # right after the static files, so session/auth queries count too
+    MIDDLEWARE.insert(1, 'core.perf.PerfBudgetMiddleware')
+
 ROOT_URLCONF = 'owniesVerse.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.perf.TimedDjangoTemplates',  # DjangoTemplates + render timing
         'DIRS': [os.path.join(BASE_DIR,'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -77,14 +97,19 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'cart.context_processor.cart_total_amount',
+                'core.context_processors.cart_summary',  # lazy, replaces cart.context_processor.cart_total_amount
             ],
         },
     },
 ]
 
+
 CART_SESSION_ID = 'cart'
 
+# home page product grid (keyset pagination)
+PRODUCT_GRID_PAGE_SIZE = 9
+PRODUCT_GRID_APPROX_TOTAL = True  # cached "about N products", set False to skip the COUNT entirely
+
 WSGI_APPLICATION = 'owniesVerse.wsgi.application'
 
 
@@ -99,6 +124,40 @@ DATABASES = {
 }
 
 
+# buffered page view counters (core/counters.py), flushed after this many
+# seconds or hits, whichever comes first
+VIEW_COUNTER_FLUSH_INTERVAL = 30
+VIEW_COUNTER_FLUSH_THRESHOLD = 50
+
+# anonymous full page cache (core/page_cache.py): seconds a page is fresh, then
+# how much longer a stale copy may be served while one request re-renders it;
+# with several workers it needs a shared cache (CACHE_IS_SHARED, see `check --deploy`)
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=300, cast=int)  # 0 turns it off
+PAGE_CACHE_STALE = config('PAGE_CACHE_STALE', default=600, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem is per process, point CACHE_BACKEND/CACHE_LOCATION at redis or memcached
+# in production so all workers share cached fragments
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='owniesverse'),
+    }
+}
+# every worker process sees the same cache (redis, memcached, database ...), not a copy of its own
+CACHE_IS_SHARED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# unchanged sessions are not re-saved (core/sessions.py), the cache goes in front of the
+# session table only when it is shared; purge expired rows with `python manage.py purge_sessions`
+SESSION_ENGINE = config('SESSION_ENGINE', default='core.cached_sessions' if CACHE_IS_SHARED else 'core.sessions')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -147,8 +206,28 @@ MEDIA_ROOT = os.path.join(BASE_DIR,'media')
 # folder where user-uploaded files are stored
 
 MEDIA_URL = 'media/'
+
+# core.media.serve: blank sends media from Django (Range, 304s, sendfile under gunicorn),
+# 'x-accel' (nginx, internal location at MEDIA_ACCEL_PREFIX) or 'x-sendfile' hands it to the proxy
+MEDIA_OFFLOAD = config('MEDIA_OFFLOAD', default='')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=60 * 60 * 24, cast=int)
+
+# resized WebP/JPEG copies of catalog images (core/thumbnails.py),
+# `python manage.py build_thumbnails` backfills existing media
+THUMBNAIL_WIDTHS = (160, 320, 480, 640, 960)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_WORKERS = 2
+
 STATIC_URL = 'static/'
 
+# collectstatic writes content hashed names plus .gz/.br copies (brotli if installed),
+# core.staticfiles.StaticFilesMiddleware serves them with year long caching
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
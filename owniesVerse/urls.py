@@ -14,19 +14,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path,include
+from django.urls import path,include,re_path
 
 from django.conf import settings
-from django.conf.urls.static import static
+
+from core import media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("",include('core.urls')),
     path("accounts/",include('accounts.urls')),
     path("ckeditor5/", include('django_ckeditor_5.urls')),
-    path("payments/", include("payments.urls"))
+    path("payments/", include("payments.urls")),
+    # uploads, with or without DEBUG (core/media.py)
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), media.serve),
     
-] + static(settings.MEDIA_URL, document_root = settings.MEDIA_ROOT)
+]
 
 
@@ -0,0 +1,76 @@
+import uuid
+
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import redirect, aget_object_or_404
+from django.urls import reverse
+
+from accounts.models import Order
+from payments.models import Transaction
+from payments.khalti import KhaltiError
+from payments.khalti_async import get_async_client
+
+
+'''
+Async versions of the Khalti views
+
+Both views spend nearly all their time waiting on the gateway. Served through
+owniesVerse/asgi.py (uvicorn/daphne) that wait no longer holds a worker,
+so many payment redirects can be in flight at once.
+Enabled with KHALTI_ASYNC_VIEWS = True, see payments/urls.py.
+'''
+
+
+async def initkhalti(request, id):
+    data = await aget_object_or_404(Order, id=id)
+    user = await request.auser()
+
+    return_url = request.build_absolute_uri(reverse('verify'))
+
+    payload = {
+        "return_url": return_url,
+        "website_url": return_url,
+        "amount": int(data.total * 100),
+        "purchase_order_id": data.id,
+        "transaction_id": str(uuid.uuid4()),
+        "purchase_order_name": str(data.total),
+        "customer_info": {
+            "name": user.username,
+            "email": user.email,
+            "phone": user.phone
+        }
+    }
+
+    try:
+        response = await get_async_client().initiate(payload)
+    except KhaltiError as e:
+        messages.error(request, f"Payment could not be started. {e}")
+        return redirect('my_order')
+
+    return redirect(response['payment_url'])
+
+
+async def verifyKhalti(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+    pidx = request.GET.get('pidx')
+    transaction_id = request.GET.get('transaction_id')
+    purchase_order_id = request.GET.get('purchase_order_id')
+
+    try:
+        new_res = await get_async_client().lookup(pidx)
+    except KhaltiError as e:
+        messages.error(request, f"Payment could not be verified. {e}")
+        return redirect('my_order')
+
+    if new_res['status'] == 'Completed':
+        user = await request.auser()
+        order = await aget_object_or_404(Order, id=purchase_order_id)
+        order.is_pay = True
+        await order.asave()
+        await Transaction.objects.acreate(order=order, user=user, transaction_id=transaction_id,
+                                          total=new_res['total_amount'])
+    else:
+        messages.warning(request, f"Payment {new_res['status'].lower()}.")
+    return redirect('my_order')
@@ -0,0 +1,195 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+'''
+Khalti ePayment client
+
+One shared keep-alive Session per process, connect/read timeouts on every call,
+a few retries with exponential backoff, and a circuit breaker so that when the
+gateway is down we fail fast instead of tying up workers waiting on it.
+'''
+
+
+class KhaltiError(Exception):
+    """The gateway answered with an error or could not be reached"""
+
+
+class KhaltiUnavailable(KhaltiError):
+    """The circuit breaker is open, the gateway was not called"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` failures in a row,
+    open -> half-open after `reset_timeout` seconds (one trial call),
+    half-open -> closed on success, back to open on failure.
+    allow() hands out the half-open trial as a token; whoever holds it passes
+    it to finish() once done, so a trial that ended in an unexpected exception
+    (neither success() nor failure()) does not keep the breaker half-open forever.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """False to refuse the call, otherwise a token for finish()"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and self._trial is None:
+                self._trial = object()
+                return self._trial
+            return False
+
+    def finish(self, token):
+        with self._lock:
+            if self._trial is token:
+                self._trial = None
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = None
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class BaseKhaltiClient:
+    """Settings, breaker and answer parsing shared by the sync and async clients"""
+
+    def __init__(self, base_url=None, secret_key=None, timeout=None, retries=None,
+                 backoff=None, breaker=None, pool_size=None):
+        self.base_url = (base_url or settings.KHALTI_BASE_URL).rstrip('/') + '/'
+        self.secret_key = secret_key or settings.KHALTI_SECRET_KEY
+        self.timeout = timeout or (settings.KHALTI_CONNECT_TIMEOUT, settings.KHALTI_READ_TIMEOUT)
+        self.retries = settings.KHALTI_RETRIES if retries is None else retries
+        self.backoff = settings.KHALTI_RETRY_BACKOFF if backoff is None else backoff
+        self.pool_size = pool_size or settings.KHALTI_POOL_SIZE
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.KHALTI_BREAKER_THRESHOLD,
+            reset_timeout=settings.KHALTI_BREAKER_RESET,
+        )
+        self.headers = {
+            'Authorization': self.secret_key,
+            'Content-Type': 'application/json',
+        }
+
+    def _check_breaker(self):
+        token = self.breaker.allow()
+        if not token:
+            raise KhaltiUnavailable("Khalti is not responding, please try again shortly")
+        return token
+
+    def _result(self, response):
+        """Decoded answer of a response that got through (requests or httpx)"""
+        self.breaker.success()
+        try:
+            data = response.json()
+        except ValueError:
+            raise KhaltiError(f"Unexpected answer from Khalti ({response.status_code})")
+        if response.status_code >= 400:
+            detail = data.get('detail') or data.get('error_key') or data
+            raise KhaltiError(f"Khalti rejected the request: {detail}")
+        return data
+
+
+class KhaltiClient(BaseKhaltiClient):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(self.headers)
+
+    def initiate(self, payload):
+        """Start a payment, returns Khalti's answer with `pidx` and `payment_url`"""
+        # initiate is not idempotent, only retry when the request never reached Khalti
+        return self._post('epayment/initiate/', payload, idempotent=False)
+
+    def lookup(self, pidx):
+        """Payment status for `pidx`, eg {'status': 'Completed', 'total_amount': ...}"""
+        return self._post('epayment/lookup/', {'pidx': pidx}, idempotent=True)
+
+    def _post(self, path, payload, idempotent):
+        token = self._check_breaker()
+        try:
+            return self._send(self.base_url + path, payload, idempotent)
+        finally:
+            self.breaker.finish(token)
+
+    def _send(self, url, payload, idempotent):
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code >= 500:
+                    raise KhaltiError(f"Khalti returned {response.status_code}")
+            except (requests.ConnectionError, requests.Timeout, KhaltiError) as exc:
+                # a read timeout or 5xx may have been processed already, so only lookups retry those
+                retryable = idempotent or isinstance(exc, requests.ConnectionError)
+                if retryable and attempt < self.retries:
+                    time.sleep(self.backoff * (2 ** attempt))
+                    attempt += 1
+                    continue
+                self.breaker.failure()
+                if isinstance(exc, KhaltiError):
+                    raise
+                raise KhaltiError(f"Could not reach Khalti: {exc}") from exc
+
+            return self._result(response)
+
+
+_client = None
+_breaker = None
+_client_lock = threading.Lock()
+
+
+def get_breaker():
+    """One breaker per process, shared by the sync and async clients"""
+    global _breaker
+    if _breaker is None:
+        with _client_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=settings.KHALTI_BREAKER_THRESHOLD,
+                    reset_timeout=settings.KHALTI_BREAKER_RESET,
+                )
+    return _breaker
+
+
+def get_client():
+    """The process wide client, so every request reuses the same connection pool"""
+    global _client
+    if _client is None:
+        breaker = get_breaker()
+        with _client_lock:
+            if _client is None:
+                _client = KhaltiClient(breaker=breaker)
+    return _client
@@ -0,0 +1,88 @@
+import asyncio
+
+import httpx
+
+from payments.khalti import BaseKhaltiClient, KhaltiError, get_breaker
+
+
+'''
+Async Khalti client for the views in payments/async_views.py
+
+Same timeouts, retries and circuit breaker as KhaltiClient but on httpx, so a
+request waiting on the gateway only parks a coroutine instead of a worker.
+'''
+
+
+class AsyncKhaltiClient(BaseKhaltiClient):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        connect, read = self.timeout
+        self.http = httpx.AsyncClient(
+            headers=self.headers,
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+
+    async def initiate(self, payload):
+        """Start a payment, returns Khalti's answer with `pidx` and `payment_url`"""
+        return await self._post('epayment/initiate/', payload, idempotent=False)
+
+    async def lookup(self, pidx):
+        """Payment status for `pidx`, eg {'status': 'Completed', 'total_amount': ...}"""
+        return await self._post('epayment/lookup/', {'pidx': pidx}, idempotent=True)
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    async def _post(self, path, payload, idempotent):
+        token = self._check_breaker()
+        try:
+            return await self._send(self.base_url + path, payload, idempotent)
+        finally:
+            self.breaker.finish(token)
+
+    async def _send(self, url, payload, idempotent):
+        attempt = 0
+        while True:
+            try:
+                response = await self.http.post(url, json=payload)
+                if response.status_code >= 500:
+                    raise KhaltiError(f"Khalti returned {response.status_code}")
+            except (httpx.TransportError, KhaltiError) as exc:
+                # same rule as the sync client: initiate only retries if nothing was sent
+                retryable = idempotent or isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout))
+                if retryable and attempt < self.retries:
+                    await asyncio.sleep(self.backoff * (2 ** attempt))
+                    attempt += 1
+                    continue
+                self.breaker.failure()
+                if isinstance(exc, KhaltiError):
+                    raise
+                raise KhaltiError(f"Could not reach Khalti: {exc}") from exc
+
+            return self._result(response)
+
+
+# an httpx client belongs to the event loop it was first used on, so keep one per loop
+# (uvicorn/daphne run a single loop per worker, async_to_sync makes a new one per call)
+_clients = {}
+
+
+async def _close_with_loop(loop, client):
+    """Parks until the loop shuts down (asyncio.run cancels what is left), then closes the client"""
+    try:
+        await asyncio.Event().wait()
+    finally:
+        _clients.pop(loop, None)
+        await client.aclose()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncKhaltiClient(breaker=get_breaker())
+        # the loop only keeps a weak reference to its tasks
+        client.closer = loop.create_task(_close_with_loop(loop, client))
+    return client
@@ -0,0 +1,115 @@
+import itertools
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+'''
+Local fake Khalti gateway
+
+Answers /epayment/initiate/ and /epayment/lookup/ like the sandbox does, with an
+optional artificial latency and failure rate, so the payment flow can be
+exercised and benchmarked without the network.
+
+    python manage.py run_khalti_stub --port 8765 --latency 0.2
+    KHALTI_BASE_URL=http://127.0.0.1:8765/api/v2/ python manage.py runserver
+'''
+
+
+class KhaltiStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateway
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._reply(400, {'detail': 'Invalid JSON'})
+
+        if server.latency:
+            time.sleep(server.latency)
+        if server.fail_every and next(server.counter) % server.fail_every == 0:
+            return self._reply(503, {'detail': 'Service unavailable'})
+        if not self.headers.get('Authorization'):
+            return self._reply(401, {'detail': 'Authentication credentials were not provided.'})
+
+        if self.path.endswith('/epayment/initiate/'):
+            if not body.get('amount') or not body.get('return_url'):
+                return self._reply(400, {'error_key': 'validation_error', 'amount': ['This field is required.']})
+            pidx = uuid.uuid4().hex
+            with server.lock:
+                server.payments[pidx] = body['amount']
+            return self._reply(200, {
+                'pidx': pidx,
+                'payment_url': f"{body['return_url']}?pidx={pidx}&purchase_order_id={body.get('purchase_order_id')}"
+                               f"&transaction_id={body.get('transaction_id')}",
+                'expires_in': 1800,
+            })
+
+        if self.path.endswith('/epayment/lookup/'):
+            with server.lock:
+                amount = server.payments.get(body.get('pidx'))
+            if amount is None:
+                return self._reply(404, {'detail': 'Not found.', 'error_key': 'validation_error'})
+            return self._reply(200, {
+                'pidx': body['pidx'],
+                'total_amount': amount,
+                'status': 'Completed',
+                'transaction_id': uuid.uuid4().hex[:22],
+                'fee': 0,
+                'refunded': False,
+            })
+
+        return self._reply(404, {'detail': 'Not found.'})
+
+    def _reply(self, status, data):
+        raw = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class KhaltiStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # benchmarks open many connections at once
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, fail_every=0, verbose=False):
+        super().__init__((host, port), KhaltiStubHandler)
+        self.latency = latency
+        self.fail_every = fail_every
+        self.verbose = verbose
+        self.payments = {}
+        self.lock = threading.Lock()
+        self.counter = itertools.count(1)  # next() on it is atomic
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/api/v2/'
+
+    def start(self):
+        """Serve from a background thread, returns self for `with` use"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # a client that timed out has hung up, that is the point of the latency option
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def __exit__(self, *args):
+        self.shutdown()
+        super().__exit__(*args)
+
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from payments.khalti import KhaltiClient, CircuitBreaker
+from payments.khalti_stub import KhaltiStubServer
+
+
+class Command(BaseCommand):
+    help = "Measure initiate/lookup throughput of the Khalti client against the local stub"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--latency', type=float, default=0.0, help="stub latency in seconds")
+        parser.add_argument('--base-url', help="benchmark an already running gateway instead of a fresh stub")
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        concurrency = options['concurrency']
+
+        server = None
+        base_url = options['base_url']
+        if not base_url:
+            server = KhaltiStubServer(latency=options['latency']).start()
+            base_url = server.base_url
+
+        client = KhaltiClient(
+            base_url=base_url,
+            secret_key='key test_secret_key',
+            pool_size=concurrency,
+            breaker=CircuitBreaker(failure_threshold=total + 1),
+        )
+
+        def initiate(n):
+            return client.initiate({
+                'return_url': 'http://127.0.0.1:8000/payments/verify/',
+                'website_url': 'http://127.0.0.1:8000/',
+                'amount': 1000 + n,
+                'purchase_order_id': n,
+                'purchase_order_name': f'bench {n}',
+            })['pidx']
+
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                started = time.perf_counter()
+                pidxs = list(pool.map(initiate, range(total)))
+                self._report('initiate', total, time.perf_counter() - started)
+
+                started = time.perf_counter()
+                list(pool.map(client.lookup, pidxs))
+                self._report('lookup', total, time.perf_counter() - started)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+    def _report(self, name, total, elapsed):
+        self.stdout.write(
+            f"{name:<9} {total} requests in {elapsed:.2f}s  "
+            f"{total / elapsed:8.1f} req/s  {elapsed / total * 1000:6.2f} ms avg"
+        )
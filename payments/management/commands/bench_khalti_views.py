@@ -0,0 +1,85 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, AsyncRequestFactory, override_settings
+
+from accounts.models import CustomUserModel, Order
+from payments import async_views, khalti, views
+from payments.khalti_stub import KhaltiStubServer
+
+
+class Command(BaseCommand):
+    help = ("Compare sync and async initkhalti throughput against the local Khalti stub. "
+            "Creates a throwaway user and order in the configured database and removes them again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4,
+                            help="sync worker threads, like gunicorn --workers/--threads")
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help="requests in flight at once on the async event loop")
+        parser.add_argument('--latency', type=float, default=0.2, help="stub gateway latency in seconds")
+        parser.add_argument('--pool', type=int, default=settings.KHALTI_POOL_SIZE,
+                            help="gateway connections per client (KHALTI_POOL_SIZE)")
+
+    def handle(self, *args, **options):
+        server = KhaltiStubServer(latency=options['latency']).start()
+        user = CustomUserModel.objects.create(username='khalti-bench', phone='9800000000',
+                                              street_address='bench', email='bench@example.com')
+        order = Order.objects.create(user=user, phone='9800000000', address='bench', total=Decimal('100.00'))
+        try:
+            # request factories always send Host: testserver
+            with override_settings(ALLOWED_HOSTS=['testserver'], KHALTI_BASE_URL=server.base_url,
+                                   KHALTI_POOL_SIZE=options['pool'],
+                                   KHALTI_BREAKER_THRESHOLD=options['requests'] + 1):
+                khalti._client, khalti._breaker = None, None
+                self._bench_sync(user, order, options)
+                asyncio.run(self._bench_async(user, order, options))
+        finally:
+            khalti._client, khalti._breaker = None, None
+            user.delete()
+            server.shutdown()
+            server.server_close()
+
+    def _bench_sync(self, user, order, options):
+        factory = RequestFactory()
+
+        def call(_):
+            request = factory.get('/payments/initkhalti/')
+            request.user = user
+            return views.initkhalti(request, id=order.id).status_code
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            started = time.perf_counter()
+            codes = list(pool.map(call, range(options['requests'])))
+        self._report(f"sync  ({options['workers']} workers)", codes, time.perf_counter() - started)
+
+    async def _bench_async(self, user, order, options):
+        factory = AsyncRequestFactory()
+        limit = asyncio.Semaphore(options['concurrency'])
+
+        async def auser():
+            return user
+
+        async def call():
+            async with limit:
+                request = factory.get('/payments/initkhalti/')
+                request.user = user
+                request.auser = auser
+                response = await async_views.initkhalti(request, id=order.id)
+                return response.status_code
+
+        started = time.perf_counter()
+        codes = await asyncio.gather(*(call() for _ in range(options['requests'])))
+        self._report(f"async ({options['concurrency']} in flight)", codes, time.perf_counter() - started)
+
+    def _report(self, name, codes, elapsed):
+        ok = sum(1 for code in codes if code == 302)
+        self.stdout.write(
+            f"{name:<24} {len(codes)} requests in {elapsed:.2f}s  "
+            f"{len(codes) / elapsed:8.1f} req/s  ({ok} redirected to the gateway)"
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from payments.khalti_stub import KhaltiStubServer
+
+
+class Command(BaseCommand):
+    help = "Run a local fake Khalti gateway for development and benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every answer")
+        parser.add_argument('--fail-every', type=int, default=0, help="answer 503 to every Nth request")
+
+    def handle(self, *args, **options):
+        server = KhaltiStubServer(
+            host=options['host'],
+            port=options['port'],
+            latency=options['latency'],
+            fail_every=options['fail_every'],
+            verbose=options['verbosity'] > 1,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Fake Khalti listening on {server.base_url}"))
+        self.stdout.write("Set KHALTI_BASE_URL to that address to use it.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,3 +1,180 @@
-from django.test import TestCase
+import asyncio
+import time
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import CustomUserModel, Order
+from payments import async_views, khalti_async
+from payments.khalti import CircuitBreaker, KhaltiClient, KhaltiError, KhaltiUnavailable
+from payments.khalti_stub import KhaltiStubServer
+from payments.models import Transaction
+
+
+class StubServerMixin:
+    """A KhaltiStubServer per test; its counter tells how many requests reached it"""
+
+    def start_stub(self, latency=0.0, fail_every=0):
+        # a counter that never fails when the test only wants to count
+        server = KhaltiStubServer(latency=latency, fail_every=fail_every or 10 ** 9).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.counted = 0
+        return server
+
+    def requests_seen(self, server):
+        """Requests since the last call, reading the counter takes a number too"""
+        value = next(server.counter)
+        seen, self.counted = value - self.counted - 1, value
+        return seen
+
+    def khalti_client(self, server, breaker=None, timeout=(1, 1)):
+        client = KhaltiClient(base_url=server.base_url, secret_key='test-key', timeout=timeout, retries=2,
+                              backoff=0, breaker=breaker or CircuitBreaker(failure_threshold=5, reset_timeout=60))
+        self.addCleanup(client.session.close)
+        return client
+
+
+class KhaltiClientTests(StubServerMixin, SimpleTestCase):
+
+    def payload(self):
+        return {'return_url': 'http://testserver/verify/', 'amount': 1000, 'purchase_order_id': 1,
+                'transaction_id': 'tx', 'purchase_order_name': 'order'}
+
+    def test_initiate_and_lookup(self):
+        client = self.khalti_client(self.start_stub())
+        started = client.initiate(self.payload())
+        self.assertIn(f"pidx={started['pidx']}", started['payment_url'])
+        self.assertEqual(client.lookup(started['pidx'])['total_amount'], 1000)
+        with self.assertRaises(KhaltiError):
+            client.lookup('unknown')
+
+    def test_5xx_retried_on_lookup_only(self):
+        server = self.start_stub(fail_every=1)
+        client = self.khalti_client(server)
+        with self.assertRaisesMessage(KhaltiError, '503'):
+            client.lookup('pidx')
+        self.assertEqual(self.requests_seen(server), 3)
+        with self.assertRaisesMessage(KhaltiError, '503'):
+            client.initiate(self.payload())
+        self.assertEqual(self.requests_seen(server), 1)
+
+    def test_timeouts_retried_on_lookup_only(self):
+        server = self.start_stub(latency=0.3)
+        client = self.khalti_client(server, timeout=(1, 0.05))
+        with self.assertRaisesMessage(KhaltiError, 'Could not reach Khalti'):
+            client.lookup('pidx')
+        with self.assertRaisesMessage(KhaltiError, 'Could not reach Khalti'):
+            client.initiate(self.payload())
+        # the handlers only count a request after sleeping
+        time.sleep(0.5)
+        self.assertEqual(self.requests_seen(server), 4)
+
+    def test_open_breaker_fails_fast(self):
+        server = self.start_stub(fail_every=1)
+        client = self.khalti_client(server, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        with self.assertRaises(KhaltiError):
+            client.initiate(self.payload())
+        self.assertEqual(client.breaker.state, 'open')
+        with self.assertRaises(KhaltiUnavailable):
+            client.lookup('pidx')
+        self.assertEqual(self.requests_seen(server), 1)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def opened(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0)
+        breaker.failure()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.failure()
+        return breaker
+
+    def test_half_open_allows_one_trial(self):
+        breaker = self.opened()
+        self.assertEqual(breaker.state, 'half-open')
+        token = breaker.allow()
+        self.assertTrue(token)
+        self.assertIsNot(token, True)
+        self.assertFalse(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertIs(breaker.allow(), True)
+
+    def test_failed_trial_reopens(self):
+        breaker = self.opened()
+        breaker.reset_timeout = 60
+        breaker.opened_at -= 60
+        token = breaker.allow()
+        breaker.failure()
+        breaker.finish(token)
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+    def test_trial_released_after_unexpected_exception(self):
+        breaker = self.opened()
+        client = KhaltiClient(base_url='http://127.0.0.1:9/api/v2/', secret_key='test-key', breaker=breaker)
+        self.addCleanup(client.session.close)
+        with mock.patch.object(client.session, 'post', side_effect=RuntimeError('bug')):
+            with self.assertRaises(RuntimeError):
+                client.lookup('pidx')
+        # neither success() nor failure() ran, the next caller still gets the trial
+        self.assertEqual(breaker.state, 'half-open')
+        self.assertTrue(breaker.allow())
+
+
+class AsyncKhaltiTests(StubServerMixin, TestCase):
+    """payments/async_views.py (KHALTI_ASYNC_VIEWS) against the stub"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUserModel.objects.create(username='payer', email='payer@example.com',
+                                                  phone='9800000000', street_address='Kathmandu')
+        cls.order = Order.objects.create(user=cls.user, phone='9800000000', address='Kathmandu',
+                                         total=Decimal('12.50'))
+
+    def setUp(self):
+        server = self.start_stub()
+        settings = override_settings(KHALTI_BASE_URL=server.base_url)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def request(self, path):
+        request = AsyncRequestFactory().get(path)
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        return request
+
+    async def test_initiate_then_verify(self):
+        response = await async_views.initkhalti(self.request(f'/payments/initkhalti/{self.order.pk}'), self.order.pk)
+        self.assertEqual(response.status_code, 302)
+        # the stub sends the browser straight back to verify, as Khalti does after paying
+        return_url = urlsplit(response['Location'])
+        self.assertEqual(return_url.path, '/payments/verify/')
+        self.assertIn(f'purchase_order_id={self.order.pk}', return_url.query)
+
+        response = await async_views.verifyKhalti(self.request(f'{return_url.path}?{return_url.query}'))
+        self.assertEqual(response.url, reverse('my_order'))
+        await self.order.arefresh_from_db()
+        self.assertTrue(self.order.is_pay)
+        payment = await Transaction.objects.aget(order=self.order)
+        self.assertEqual((payment.user, payment.total), ('payer', '1250'))
+
+
+class AsyncClientPerLoopTests(SimpleTestCase):
+
+    def test_one_client_per_loop_closed_with_it(self):
+        async def clients():
+            first = khalti_async.get_async_client()
+            self.assertIs(khalti_async.get_async_client(), first)
+            return asyncio.get_running_loop(), first
+
+        loop, client = asyncio.run(clients())
+        self.assertTrue(client.http.is_closed)
+        self.assertNotIn(loop, khalti_async._clients)
+        self.assertIsNot(asyncio.run(clients())[1], client)
@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from .views import initkhalti,verifyKhalti
+
+if settings.KHALTI_ASYNC_VIEWS:
+    from .async_views import initkhalti,verifyKhalti
+else:
+    from .views import initkhalti,verifyKhalti
 
 urlpatterns = [
     path("initkhalti/<int:id>",initkhalti,name="initkhalti"),